@@ -150,18 +150,11 @@ const TeacherViewSubmissions = () => {
             console.log('Downloading submission:', submission.id);
             const response = await fetch(`http://localhost:8088/api/v1/teacher/download-pdf/${submission.id}?teacher_id=${user.uid}`);
             if (response.ok) {
-                const data = await response.json();
-
-                const binaryString = atob(data.file_content);
-                const bytes = new Uint8Array(binaryString.length);
-                for (let i = 0; i < binaryString.length; i++) {
-                    bytes[i] = binaryString.charCodeAt(i);
-                }
-                const blob = new Blob([bytes], { type: 'application/pdf' });
+                const blob = await response.blob();
                 const url = window.URL.createObjectURL(blob);
                 const link = document.createElement('a');
                 link.href = url;
-                link.download = data.file_name || `submission_${user.uid}_${submission.studentName}.pdf`;
+                link.download = submission.fileName || `submission_${user.uid}_${submission.studentName}.pdf`;
                 document.body.appendChild(link);
                 link.click();
                 document.body.removeChild(link);
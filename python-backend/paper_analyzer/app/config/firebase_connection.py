@@ -1,6 +1,5 @@
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore
+import app.config.server_config as config
 
 class FirebaseConnector:
     _instance = None
@@ -12,12 +11,26 @@ class FirebaseConnector:
 
     def __init__(self):
         if not hasattr(self, 'db'):
+            self.error = None
+            if config.DB_BACKEND == "memory":
+                from app.config.memory_firestore import MemoryFirestore
+                self.db = MemoryFirestore(config.MEMORY_DB_FIXTURE)
+                print("✅ In-memory Firestore stand-in initialized")
+                return
+
             try:
+                import firebase_admin
+                from firebase_admin import credentials, firestore
+
                 # Dynamically get the path to the service account key
                 base_dir = os.path.dirname(os.path.abspath(__file__))
                 json_path = os.path.join(base_dir,"service-account-key.json")
 
                 if not firebase_admin._apps:
+                    if not os.path.exists(json_path):
+                        raise FileNotFoundError(
+                            f"{json_path} is missing (set DB_BACKEND = \"memory\" in server_config to run without Firestore)"
+                        )
                     cred = credentials.Certificate(json_path)
                     firebase_admin.initialize_app(cred)
 
@@ -26,9 +39,10 @@ class FirebaseConnector:
 
             except Exception as error:
                 print("❌ Error initializing Firestore:", error)
+                self.error = error
                 self.db = None
 
     def get_connection(self):
         if self.db is None:
-            raise RuntimeError("Firestore connection not initialized.")
-        return self.db
\ No newline at end of file
+            raise RuntimeError(f"Firestore connection not initialized: {self.error}")
+        return self.db
@@ -0,0 +1,429 @@
+import copy
+import json
+import random
+import string
+import threading
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+# Field ops understood by MemoryQuery.where (same strings as Firestore)
+_FILTER_OPS = {
+    "==": lambda value, operand: value == operand,
+    "!=": lambda value, operand: value != operand,
+    "<": lambda value, operand: value < operand,
+    "<=": lambda value, operand: value <= operand,
+    ">": lambda value, operand: value > operand,
+    ">=": lambda value, operand: value >= operand,
+    "in": lambda value, operand: value in operand,
+    "not-in": lambda value, operand: value not in operand,
+    "array_contains": lambda value, operand: isinstance(value, list) and operand in value,
+    "array_contains_any": lambda value, operand: isinstance(value, list) and any(v in value for v in operand),
+}
+
+_MISSING = object()
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+
+
+def _auto_id() -> str:
+    return "".join(random.choices(_AUTO_ID_CHARS, k=20))
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _transform_kind(value) -> Optional[str]:
+    """
+    Recognise the firestore write sentinels (SERVER_TIMESTAMP, DELETE_FIELD,
+    Increment, ArrayUnion, ArrayRemove) by type name, so this module itself
+    does not import google.cloud
+    """
+    name = type(value).__name__
+    if name == "Sentinel":
+        description = getattr(value, "description", "").lower()
+        return "delete" if "delete" in description else "server_timestamp"
+    if name in ("Increment", "ArrayUnion", "ArrayRemove"):
+        return name
+    return None
+
+
+def _get_path(data: dict, field_path: str):
+    value = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _apply_field(data: dict, field_path: str, value):
+    parts = field_path.split(".")
+    target = data
+    for part in parts[:-1]:
+        if not isinstance(target.get(part), dict):
+            target[part] = {}
+        target = target[part]
+    _apply_value(target, parts[-1], value)
+
+
+def _apply_value(target: dict, leaf: str, value):
+    kind = _transform_kind(value)
+    if kind is None:
+        target[leaf] = _resolve_values(value)
+    elif kind == "delete":
+        target.pop(leaf, None)
+    elif kind == "server_timestamp":
+        target[leaf] = _now()
+    elif kind == "Increment":
+        current = target.get(leaf)
+        target[leaf] = (current if isinstance(current, (int, float)) else 0) + value.value
+    elif kind == "ArrayUnion":
+        current = list(target.get(leaf)) if isinstance(target.get(leaf), list) else []
+        current.extend(v for v in value.values if v not in current)
+        target[leaf] = current
+    elif kind == "ArrayRemove":
+        current = target.get(leaf) if isinstance(target.get(leaf), list) else []
+        target[leaf] = [v for v in current if v not in value.values]
+
+
+def _resolve_values(value):
+    # Transforms nested in a plain value (e.g. a map holding SERVER_TIMESTAMP)
+    if isinstance(value, dict):
+        resolved = {}
+        for key, item in value.items():
+            _apply_value(resolved, key, item)
+        return resolved
+    if isinstance(value, list):
+        return [_resolve_values(item) for item in value]
+    return copy.deepcopy(value)
+
+
+def _merge(target: dict, data: dict):
+    for key, value in data.items():
+        if isinstance(value, dict) and _transform_kind(value) is None and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            _apply_value(target, key, value)
+
+
+class MemoryDocumentSnapshot:
+    def __init__(self, reference: "MemoryDocumentReference", data: Optional[dict]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.create_time = self.update_time = self.read_time = _now()
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str):
+        value = _get_path(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class MemoryDocumentReference:
+    def __init__(self, client: "MemoryFirestore", collection_path: str, document_id: str):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = document_id
+        self.path = f"{collection_path}/{document_id}"
+
+    @property
+    def parent(self) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, self._collection_path)
+
+    def collection(self, collection_id: str) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, field_paths: Iterable[str] = None, transaction=None) -> MemoryDocumentSnapshot:
+        data = self._client._read(self._collection_path, self.id)
+        if data is not None and field_paths is not None:
+            data = _project(data, field_paths)
+        return MemoryDocumentSnapshot(self, data)
+
+    def set(self, document_data: dict, merge: bool = False):
+        self._client._write(("merge" if merge else "set", self, document_data))
+        return _WriteResult()
+
+    def create(self, document_data: dict):
+        if self._client._read(self._collection_path, self.id) is not None:
+            raise ValueError(f"Document already exists: {self.path}")
+        return self.set(document_data)
+
+    def update(self, field_updates: dict):
+        self._client._write(("update", self, field_updates))
+        return _WriteResult()
+
+    def delete(self):
+        self._client._write(("delete", self, None))
+        return _WriteResult()
+
+
+class _WriteResult:
+    def __init__(self):
+        self.update_time = _now()
+
+
+def _project(data: dict, field_paths: Iterable[str]) -> dict:
+    projected = {}
+    for field_path in field_paths:
+        value = _get_path(data, field_path)
+        if value is not _MISSING:
+            _apply_field(projected, field_path, value)
+    return projected
+
+
+class MemoryQuery:
+    def __init__(self, client: "MemoryFirestore", collection_path: str, filters=(), projection=None,
+                 orders=(), limit_count=None, offset_count=0):
+        self._client = client
+        self._collection_path = collection_path
+        self._filters = tuple(filters)
+        self._projection = projection
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._offset = offset_count
+
+    def _copy(self, **changes) -> "MemoryQuery":
+        state = dict(filters=self._filters, projection=self._projection, orders=self._orders,
+                     limit_count=self._limit, offset_count=self._offset)
+        state.update(changes)
+        return MemoryQuery(self._client, self._collection_path, **state)
+
+    def where(self, field_path: str = None, op_string: str = None, value=None, *, filter=None) -> "MemoryQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in _FILTER_OPS:
+            raise ValueError(f"Unsupported filter operator: {op_string}")
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def select(self, field_paths: Iterable[str]) -> "MemoryQuery":
+        return self._copy(projection=list(field_paths))
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "MemoryQuery":
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int) -> "MemoryQuery":
+        return self._copy(limit_count=count)
+
+    def offset(self, count: int) -> "MemoryQuery":
+        return self._copy(offset_count=count)
+
+    def count(self, alias: str = None) -> "MemoryAggregationQuery":
+        return MemoryAggregationQuery(self, alias or "count")
+
+    def _matches(self, data: dict) -> bool:
+        for field_path, op_string, operand in self._filters:
+            value = _get_path(data, field_path)
+            if value is _MISSING:
+                return False
+            try:
+                if not _FILTER_OPS[op_string](value, operand):
+                    return False
+            except TypeError:
+                # Firestore never matches values of different types
+                return False
+        return True
+
+    def _documents(self) -> List[tuple]:
+        documents = [(document_id, data) for document_id, data in self._client._scan(self._collection_path)
+                     if self._matches(data)]
+
+        for field_path, direction in reversed(self._orders):
+            documents = [document for document in documents if _get_path(document[1], field_path) is not _MISSING]
+            documents.sort(key=lambda document: _get_path(document[1], field_path),
+                           reverse=str(direction).upper().startswith("DESC"))
+
+        documents = documents[self._offset:]
+        if self._limit is not None:
+            documents = documents[:self._limit]
+        return documents
+
+    def stream(self, transaction=None):
+        for document_id, data in self._documents():
+            if self._projection is not None:
+                data = _project(data, self._projection)
+            reference = MemoryDocumentReference(self._client, self._collection_path, document_id)
+            yield MemoryDocumentSnapshot(reference, data)
+
+    def get(self, transaction=None) -> List[MemoryDocumentSnapshot]:
+        return list(self.stream())
+
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client: "MemoryFirestore", collection_path: str):
+        super().__init__(client, collection_path)
+        self.id = collection_path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: str = None) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self._client, self._collection_path, document_id or _auto_id())
+
+    def add(self, document_data: dict, document_id: str = None):
+        reference = self.document(document_id)
+        reference.create(document_data)
+        return _now(), reference
+
+    def list_documents(self) -> List[MemoryDocumentReference]:
+        return [self.document(document_id) for document_id, _ in self._client._scan(self._collection_path)]
+
+
+class _AggregationResult:
+    def __init__(self, alias: str, value):
+        self.alias = alias
+        self.value = value
+        self.read_time = _now()
+
+
+class MemoryAggregationQuery:
+    def __init__(self, query: MemoryQuery, alias: str):
+        self._query = query
+        self._alias = alias
+
+    def get(self, transaction=None):
+        return [[_AggregationResult(self._alias, len(self._query._documents()))]]
+
+    def stream(self, transaction=None):
+        yield from self.get()
+
+
+class MemoryWriteBatch:
+    def __init__(self, client: "MemoryFirestore"):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, reference: MemoryDocumentReference, document_data: dict, merge: bool = False):
+        self._writes.append(("merge" if merge else "set", reference, document_data))
+
+    def update(self, reference: MemoryDocumentReference, field_updates: dict):
+        self._writes.append(("update", reference, field_updates))
+
+    def delete(self, reference: MemoryDocumentReference):
+        self._writes.append(("delete", reference, None))
+
+    def commit(self):
+        # Applied atomically, like a Firestore batch
+        self._client._write(*self._writes)
+        results = [_WriteResult() for _ in self._writes]
+        self._writes = []
+        return results
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """
+    Writes queued by a function wrapped with MemoryFirestore.transactional
+    """
+
+
+class MemoryFirestore:
+    """
+    In-process stand-in for the Firestore client (DB_BACKEND = "memory").
+
+    Implements the part of the google.cloud.firestore API the backend uses:
+    collections and subcollections, documents, where/select/order_by/limit
+    queries, count() aggregations, batches, transactions, get_all and the SERVER_TIMESTAMP /
+    Increment / ArrayUnion / ArrayRemove transforms. Data lives in a dict of
+    collections, optionally seeded from a JSON fixture
+    ({collection: {document_id: fields}}) and written back with dump(), so
+    endpoints can be load tested offline with realistic volumes.
+
+    It replaces the Firestore project and its credentials, not the SDK: the
+    models and controllers import firebase_admin and FieldFilter at module
+    level, so firebase-admin must still be installed.
+    """
+
+    def __init__(self, fixture_path: str = None):
+        self._collections = {}
+        self._lock = threading.RLock()
+        if fixture_path:
+            self.load(fixture_path)
+
+    def collection(self, collection_path: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, collection_path.strip("/"))
+
+    def document(self, document_path: str) -> MemoryDocumentReference:
+        collection_path, document_id = document_path.strip("/").rsplit("/", 1)
+        return MemoryDocumentReference(self, collection_path, document_id)
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def transaction(self) -> MemoryTransaction:
+        return MemoryTransaction(self)
+
+    def transactional(self, to_wrap):
+        """
+        Stand-in for firestore.transactional: the function runs and its writes
+        are committed while holding the store lock, so nothing is written
+        between its reads and its commit
+        """
+        def run(transaction: MemoryTransaction, *args, **kwargs):
+            with self._lock:
+                result = to_wrap(transaction, *args, **kwargs)
+                transaction.commit()
+                return result
+        return run
+
+    def get_all(self, references: Iterable[MemoryDocumentReference], field_paths: Iterable[str] = None,
+                transaction=None):
+        field_paths = list(field_paths) if field_paths is not None else None
+        for reference in references:
+            yield reference.get(field_paths)
+
+    def collections(self) -> List[MemoryCollectionReference]:
+        with self._lock:
+            paths = [path for path in self._collections if "/" not in path]
+        return [self.collection(path) for path in sorted(paths)]
+
+    def load(self, fixture_path: str):
+        with open(fixture_path, "r", encoding="utf-8") as fixture:
+            collections = json.load(fixture)
+        with self._lock:
+            for collection_path, documents in collections.items():
+                self._collections.setdefault(collection_path, {}).update(documents)
+
+    def dump(self, fixture_path: str):
+        with self._lock:
+            snapshot = copy.deepcopy(self._collections)
+        with open(fixture_path, "w", encoding="utf-8") as fixture:
+            json.dump(snapshot, fixture, default=str)
+
+    def clear(self):
+        with self._lock:
+            self._collections.clear()
+
+    def _read(self, collection_path: str, document_id: str) -> Optional[dict]:
+        with self._lock:
+            data = self._collections.get(collection_path, {}).get(document_id)
+            return copy.deepcopy(data) if data is not None else None
+
+    def _scan(self, collection_path: str) -> List[tuple]:
+        # Firestore returns unordered queries sorted by document id
+        with self._lock:
+            documents = self._collections.get(collection_path, {})
+            return [(document_id, copy.deepcopy(documents[document_id])) for document_id in sorted(documents)]
+
+    def _write(self, *writes):
+        with self._lock:
+            # Validate every write before applying any, so a batch is all or nothing
+            for operation, reference, _ in writes:
+                if operation == "update" and self._read(reference._collection_path, reference.id) is None:
+                    raise KeyError(f"No document to update: {reference.path}")
+
+            for operation, reference, data in writes:
+                documents = self._collections.setdefault(reference._collection_path, {})
+                if operation == "delete":
+                    documents.pop(reference.id, None)
+                elif operation == "set":
+                    documents[reference.id] = _resolve_values(data)
+                elif operation == "merge":
+                    _merge(documents.setdefault(reference.id, {}), data)
+                elif operation == "update":
+                    document = documents[reference.id]
+                    for field_path, value in data.items():
+                        _apply_field(document, field_path, value)
@@ -1,7 +1,72 @@
 # config.py
+import os
+
 HOST = "127.0.0.1"
 PORT = 8088
 RELOAD = True
 USE_CPU_FOR_AI = True
 MAX_CONTENT_LENGTH = 2048
-GEMINI_API_KEY = ""
\ No newline at end of file
+GEMINI_API_KEY = ""
+
+# Local LLM (loaded once per process by app.service.model_registry)
+MODEL_FILE = "mistral-7b-instruct-v0.1.Q4_K_S.gguf"
+MODEL_TYPE = "mistral"
+MODEL_CONTEXT_LENGTH = 2048
+MODEL_GPU_LAYERS = 15
+
+# Micro-batching of LLM prompts (app.service.inference_scheduler)
+LLM_MAX_BATCH_SIZE = 8
+LLM_MAX_WAIT_MS = 25
+
+# Bounded worker pools for blocking work (app.service.task_executor)
+INGESTION_WORKERS = 2
+INGESTION_QUEUE_SIZE = 8
+DOCUMENT_WORKERS = 4
+DOCUMENT_QUEUE_SIZE = 32
+EXECUTOR_RETRY_AFTER_SECONDS = 30
+
+# Background PDF ingestion jobs (app.service.ingestion_jobs)
+JOB_RETENTION_SECONDS = 3600
+
+# Local caches (SQLite files) live here
+CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "resources", "cache"))
+
+# Persistent prompt -> completion cache (app.service.llm_cache)
+LLM_CACHE_ENABLED = True
+LLM_CACHE_MAX_MB = 256
+
+# Process pool for the all-subjects frequency analysis (app.service.question_clustering)
+ANALYSIS_PROCESS_WORKERS = os.cpu_count() or 1
+ANALYSIS_PARALLEL_MIN_PAIRS = 2_000_000
+
+# Parallel PDF text extraction (app.service.pdf_pages)
+PDF_EXTRACT_PROCESSES = min(4, os.cpu_count() or 1)
+PDF_PARALLEL_MIN_PAGES = 64
+PDF_PAGES_PER_SHARD = 16
+
+# Storage backend (app.config.firebase_connection): "firestore" needs
+# service-account-key.json, "memory" is an in-process stand-in for offline
+# load tests, optionally seeded from a JSON fixture {collection: {id: fields}}
+DB_BACKEND = "firestore"
+MEMORY_DB_FIXTURE = None
+
+# Assignment title / due date cache for the student submissions list (app.controller.student_controller)
+ASSIGNMENT_CACHE_TTL_SECONDS = 300
+ASSIGNMENT_CACHE_MAX_ENTRIES = 4096
+
+# Submission PDFs (app.service.blob_store): "local" keeps them under BLOB_STORE_DIR,
+# "s3" in BLOB_S3_BUCKET (BLOB_S3_ENDPOINT_URL for S3-compatible stores, needs boto3)
+BLOB_STORE_BACKEND = "local"
+BLOB_STORE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "resources", "blobs"))
+BLOB_S3_BUCKET = ""
+BLOB_S3_PREFIX = "submissions/"
+BLOB_S3_ENDPOINT_URL = None
+
+# Per-class late/missing submissions report (app.controller.teacher_controller)
+LATE_REPORT_CACHE_TTL_SECONDS = 120
+LATE_REPORT_CACHE_MAX_ENTRIES = 1024
+
+# Bulk question saves (app.model.firebase_db_model.save_structured_questions):
+# batches of 500 committed this many at a time, each retried on failure
+QUESTION_WRITE_WORKERS = 4
+QUESTION_WRITE_RETRIES = 3
@@ -1,5 +1,6 @@
 from fastapi import APIRouter,UploadFile, File, HTTPException, Form, Query
 from app.service.gemini_service import start_gemini_chat,start_grading
+from app.service.task_executor import ExecutorSaturatedError
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -19,6 +20,9 @@ async def start_conversation(request:Message):
 async def grade_papers(userid:str,file:UploadFile = File(...)):
     try:
         return await start_grading(userid,file)
+    except ExecutorSaturatedError as error:
+        raise HTTPException(status_code=429, detail=error.to_dict(),
+                            headers={"Retry-After": str(error.retry_after)})
     except Exception as error:
         print(f"Faild to grade {error}")
         return f"Faild to grade {error}"
@@ -1,17 +1,25 @@
+import asyncio
+import json
 from fastapi import APIRouter,UploadFile, File, HTTPException, Form, Query
-from app.service.pdf_service import process_pdf
+from fastapi.responses import StreamingResponse
+from app.service.pdf_service import process_pdf, submit_pdf_job
+from app.service.pdf_pages import spool_upload
+from app.service.ingestion_jobs import job_store, FINISHED_STATES
 from app.service.frequency_analyizer import analyse_frequent_questions
+from app.service.task_executor import ExecutorSaturatedError
 
 
 router = APIRouter()
 
 #POST http:localhost:port/pdf-reader?isPaper=
+#An already ingested file (same bytes, subject and isPaper) returns its earlier result unless force=true
 
 @router.post("/pdf-reader")
 async def upload_file(
         isPaper: bool = Query(...),
         subject: str = Query(...),
-        file: UploadFile = File(...)
+        file: UploadFile = File(...),
+        force: bool = Query(False)
 ):
     try:
         if file.content_type != "application/pdf":
@@ -19,14 +27,88 @@ async def upload_file(
 
         print(f"Received: subject='{subject}', isPaper={isPaper}, file='{file.filename}'")
 
-        results = await process_pdf(isPaper, file, subject)
+        results = await process_pdf(isPaper, file, subject, force)
         return {"filename": file.filename, "subject": subject, "message": results}
 
+    except ExecutorSaturatedError as error:
+        raise HTTPException(status_code=429, detail=error.to_dict(),
+                            headers={"Retry-After": str(error.retry_after)})
     except Exception as error:
         print(f"Controller error: {error}")
         return f"Reading Failed: {str(error)}"
     
 
+#POST http:localhost:port/pdf-reader/jobs?isPaper=&subject=
+#Returns a job id straight away, poll /pdf-reader/jobs/{job_id} or stream /events
+@router.post("/pdf-reader/jobs", status_code=202)
+async def upload_file_as_job(
+        isPaper: bool = Query(...),
+        subject: str = Query(...),
+        file: UploadFile = File(...),
+        force: bool = Query(False)
+):
+    if file.content_type != "application/pdf":
+        raise HTTPException(status_code=400, detail="Only PDF Files are Allowed")
+
+    try:
+        print(f"Received job: subject='{subject}', isPaper={isPaper}, file='{file.filename}'")
+
+        # Spooled to a temp file, the job removes it when it is done
+        upload = await spool_upload(file)
+        job = await submit_pdf_job(isPaper, upload, subject, force)
+
+        return {
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "queue_position": job["queue_position"],
+            "status_url": f"/api/v1/pdf-reader/jobs/{job['job_id']}",
+            "events_url": f"/api/v1/pdf-reader/jobs/{job['job_id']}/events"
+        }
+
+    except ExecutorSaturatedError as error:
+        raise HTTPException(status_code=429, detail=error.to_dict(),
+                            headers={"Retry-After": str(error.retry_after)})
+    except Exception as error:
+        # submit_pdf_job already removed the upload and the job
+        print(f"Controller error: {error}")
+        raise HTTPException(status_code=500, detail=f"Could not queue {file.filename}: {error}")
+
+
+@router.get("/pdf-reader/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+#Server-Sent Events stream of job progress, closes when the job finishes
+@router.get("/pdf-reader/jobs/{job_id}/events")
+async def stream_upload_job(job_id: str):
+    if job_store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def job_events():
+        last_version = -1
+        while True:
+            job = job_store.get(job_id)
+            if job is None:
+                yield "event: error\ndata: {\"detail\": \"Job not found\"}\n\n"
+                return
+
+            if job["version"] != last_version:
+                last_version = job["version"]
+                yield f"event: progress\ndata: {json.dumps(job, default=str)}\n\n"
+
+            if job["status"] in FINISHED_STATES:
+                return
+
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(job_events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
 #http://localhost:[port]/pdf-reader/analyze?subject=statistics
 @router.post("/pdf-reader/analyze")
 async def analyse_questions(subject: str = None,file: UploadFile = File(None)):
@@ -40,6 +122,9 @@ async def analyse_questions(subject: str = None,file: UploadFile = File(None)):
             return await analyse_frequent_questions(subject)
         else:
             return await analyse_frequent_questions(subject,file)
+    except ExecutorSaturatedError as error:
+        raise HTTPException(status_code=429, detail=error.to_dict(),
+                            headers={"Retry-After": str(error.retry_after)})
     except Exception as e:
         print("Error :",str(e))
         return "Server Error"
@@ -4,6 +4,7 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from app.model.test_models import GeneratedTest
 from app.service.pdf_export_service import PDFExportService
+from app.service.task_executor import document_executor, ExecutorSaturatedError
 from io import BytesIO
 
 router = APIRouter()
@@ -15,7 +16,8 @@ async def export_text_pdf(test: GeneratedTest):
     Generate and download PDF
     """
     try:
-        pdf_bytes = pdf_service.generate_test_pdf(test)
+        # reportlab rendering is CPU-bound, keep it off the event loop
+        pdf_bytes = await document_executor.run(pdf_service.generate_test_pdf, test)
 
         #Create filename
         filename = f"{test.subject}_test.pdf"
@@ -31,5 +33,8 @@ async def export_text_pdf(test: GeneratedTest):
             }
         )
 
+    except ExecutorSaturatedError as error:
+        raise HTTPException(status_code=429, detail=error.to_dict(),
+                            headers={"Retry-After": str(error.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
@@ -1,19 +1,52 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends
-from typing import List, Dict
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Header
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Dict, Optional
 import traceback
 from datetime import datetime, timezone, timedelta
-import base64
 import uuid
+from google.cloud.firestore_v1 import FieldFilter
 
 from app.config.firebase_connection import FirebaseConnector
+import app.config.server_config as config
 
-from app.controller.teacher_controller import get_current_user
-from app.model.firebase_db_model import get_students_with_feedback
+from app.controller.teacher_controller import get_current_user, invalidate_late_report
+from app.model.firebase_db_model import get_students_with_feedback, bulk_write
+from app.service.pdf_pages import spool_upload
+from app.service.submission_files import SUBMISSION_LIST_FIELDS, store_submission_pdf, submission_pdf_response
+from app.service.ttl_cache import TTLCache
 
 router = APIRouter()
 connector = FirebaseConnector()
 __db = connector.get_connection()
 
+# Assignments are never edited after creation, so their title / due date can be cached
+_assignment_summaries = TTLCache(config.ASSIGNMENT_CACHE_TTL_SECONDS, config.ASSIGNMENT_CACHE_MAX_ENTRIES)
+
+
+def _get_assignment_summaries(assignment_ids) -> dict:
+    """
+    Title and due date of every given assignment, with the uncached ones
+    fetched in a single get_all round trip
+    """
+    summaries = _assignment_summaries.get_many(assignment_ids)
+    missing = [assignment_id for assignment_id in assignment_ids if assignment_id not in summaries]
+
+    if missing:
+        assignments_ref = __db.collection("assignments")
+        refs = [assignments_ref.document(assignment_id) for assignment_id in missing]
+        for assignment_doc in __db.get_all(refs, field_paths=["title", "dueDate"]):
+            if not assignment_doc.exists:
+                continue
+            assignment_data = assignment_doc.to_dict()
+            summary = {
+                "title": assignment_data.get("title", "Unknown Assignment"),
+                "dueDate": assignment_data.get("dueDate")
+            }
+            _assignment_summaries.put(assignment_doc.id, summary)
+            summaries[assignment_doc.id] = summary
+
+    return summaries
+
 def get_current_user_email():
     return "student@example.com"
 
@@ -111,7 +144,7 @@ async def submit_pdf_assignment(
         class_id: str = Form(...),
         file: UploadFile = File(...)
 ):
-    """Submit PDF assignment - Store PDF as base64 in Firestore"""
+    """Submit PDF assignment - Store PDF in the blob store, the submission keeps a reference"""
     try:
         print(f"Student {student_email} submitting assignment {assignment_id}")
 
@@ -133,9 +166,9 @@ async def submit_pdf_assignment(
         for doc in existing_docs:
             raise HTTPException(status_code=400, detail="Assignment already submitted")
 
-        # Read and encode PDF file as base64
-        file_content = await file.read()
-        pdf_base64 = base64.b64encode(file_content).decode('utf-8')
+        # Spool the PDF to disk and store it by content hash (a copy or S3 upload, off the event loop)
+        with await spool_upload(file) as upload:
+            pdf_fields = await run_in_threadpool(store_submission_pdf, upload)
 
         # Check if submission is late - FIXED DATETIME COMPARISON
         current_time = datetime.now(timezone.utc)
@@ -151,7 +184,7 @@ async def submit_pdf_assignment(
         is_late = current_time > due_date
         days_late = (current_time - due_date).days if is_late else 0
 
-        # Create submission record with PDF stored as base64
+        # Create submission record referencing the stored PDF
         submission_ref = __db.collection("submissions").document()
         submission_data = {
             "id": submission_ref.id,
@@ -160,8 +193,7 @@ async def submit_pdf_assignment(
             "studentName": student_name,
             "classId": class_id,
             "fileName": file.filename,
-            "fileSize": len(file_content),
-            "pdfBase64": pdf_base64,
+            **pdf_fields,
             "submittedAt": current_time.isoformat(),
             "status": "submitted",
             "isLate": is_late,
@@ -171,15 +203,19 @@ async def submit_pdf_assignment(
         }
 
         submission_ref.set(submission_data)
+        invalidate_late_report(assignment_data.get("classId"))
+        invalidate_late_report(class_id)
 
-        # Mark notification as seen
+        # Mark notifications as seen, in one batch
         notifications_ref = __db.collection("student_notifications")
-        notification_query = notifications_ref.where("assignmentId", "==", assignment_id).where("studentEmail", "==", student_email)
-        notification_docs = notification_query.stream()
-
-        for notification_doc in notification_docs:
-            notification_ref = __db.collection("student_notifications").document(notification_doc.id)
-            notification_ref.update({"isSeen": True})
+        notification_query = (notifications_ref.where("assignmentId", "==", assignment_id)
+                              .where("studentEmail", "==", student_email)
+                              .where("isSeen", "==", False)
+                              .select([]))
+        writes = [("update", notification_doc.reference, {"isSeen": True})
+                  for notification_doc in notification_query.stream()]
+        if writes:
+            bulk_write(writes, f"Notifications seen by {student_email}")
 
         print(f"Assignment submitted successfully! Late: {is_late}")
 
@@ -208,20 +244,15 @@ async def get_student_classes(request: dict):
 
         print(f"🎓 Fetching classes for student: {student_email}")
 
+        # enrolledEmails mirrors the students list, so this is one indexed query
         classes_ref = __db.collection("classes")
-        classes_docs = classes_ref.stream()
+        query = classes_ref.where(filter=FieldFilter("enrolledEmails", "array_contains", student_email))
 
         student_classes = []
-
-        for doc in classes_docs:
+        for doc in query.stream():
             class_data = doc.to_dict()
             class_data["id"] = doc.id
-
-            students = class_data.get("students", [])
-            student_in_class = any(student.get("email") == student_email for student in students)
-
-            if student_in_class:
-                student_classes.append(class_data)
+            student_classes.append(class_data)
 
         return {
             "student_email": student_email,
@@ -237,31 +268,26 @@ async def get_student_classes(request: dict):
 async def get_student_submissions(student_email: str):
     """Get all submissions by student"""
     try:
+        # Legacy inline PDFs (pdfBase64) are never downloaded for the list
         submissions_ref = __db.collection("submissions")
-        query = submissions_ref.where("studentEmail", "==", student_email)
-        docs = query.stream()
+        query = submissions_ref.where("studentEmail", "==", student_email).select(SUBMISSION_LIST_FIELDS)
 
         submissions = []
-        for doc in docs:
+        for doc in query.stream():
             submission_data = doc.to_dict()
             submission_data["id"] = doc.id
+            # Submissions stored before hasPdf existed always came with their PDF
+            submission_data.setdefault("hasPdf", True)
+            submissions.append(submission_data)
 
-            # Get assignment details
-            assignment_ref = __db.collection("assignments").document(submission_data["assignmentId"])
-            assignment_doc = assignment_ref.get()
-            if assignment_doc.exists:
-                assignment_data = assignment_doc.to_dict()
-                submission_data["assignmentTitle"] = assignment_data.get("title", "Unknown Assignment")
-                submission_data["assignmentDueDate"] = assignment_data.get("dueDate")
-
-            # Don't include the base64 PDF in the list to reduce data transfer
-            if "pdfBase64" in submission_data:
-                submission_data["hasPdf"] = True
-                del submission_data["pdfBase64"]
-            else:
-                submission_data["hasPdf"] = False
+        assignment_ids = list(dict.fromkeys(s["assignmentId"] for s in submissions if s.get("assignmentId")))
+        summaries = _get_assignment_summaries(assignment_ids)
 
-            submissions.append(submission_data)
+        for submission_data in submissions:
+            summary = summaries.get(submission_data.get("assignmentId"))
+            if summary:
+                submission_data["assignmentTitle"] = summary["title"]
+                submission_data["assignmentDueDate"] = summary["dueDate"]
 
         return {"submissions": submissions}
 
@@ -270,8 +296,8 @@ async def get_student_submissions(student_email: str):
         raise HTTPException(status_code=500, detail=f"Failed to fetch submissions: {str(e)}")
 
 @router.get("/student/download-pdf/{submission_id}")
-async def download_submission_pdf(submission_id: str):
-    """Download PDF for a specific submission"""
+async def download_submission_pdf(submission_id: str, range: Optional[str] = Header(None)):
+    """Download PDF for a specific submission, streamed with Range support"""
     try:
         submission_ref = __db.collection("submissions").document(submission_id)
         submission_doc = submission_ref.get()
@@ -279,21 +305,10 @@ async def download_submission_pdf(submission_id: str):
         if not submission_doc.exists:
             raise HTTPException(status_code=404, detail="Submission not found")
 
-        submission_data = submission_doc.to_dict()
-        pdf_base64 = submission_data.get("pdfBase64")
-
-        if not pdf_base64:
-            raise HTTPException(status_code=404, detail="PDF not found")
-
-        # Decode base64 back to bytes
-        pdf_bytes = base64.b64decode(pdf_base64)
-
-        return {
-            "file_name": submission_data.get("fileName", "submission.pdf"),
-            "file_content": pdf_base64,  # Return as base64 for frontend
-            "content_type": "application/pdf"
-        }
+        return submission_pdf_response(submission_doc.to_dict(), range)
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error downloading PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to download PDF: {str(e)}")
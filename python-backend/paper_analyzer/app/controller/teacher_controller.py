@@ -1,15 +1,28 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Header, BackgroundTasks
 from datetime import datetime, timezone, timedelta
 from typing import List, Optional, Dict
 import uuid
 import traceback
 from firebase_admin import firestore
+from google.cloud.firestore_v1 import FieldFilter
 from app.config.firebase_connection import FirebaseConnector
+import app.config.server_config as config
+from app.service.submission_files import SUBMISSION_LIST_FIELDS, submission_pdf_response
+from app.model.firebase_db_model import class_enrolled_emails, bulk_write
+from app.service.ttl_cache import TTLCache
+from app.service import teacher_stats_service
 
 router = APIRouter()
 connector = FirebaseConnector()
 __db = connector.get_connection()
 
+# Firestore accepts at most 30 values in an "in" filter
+FIRESTORE_IN_LIMIT = 30
+
+# Late/missing report per class, dropped whenever a submission, grade,
+# reminder, assignment or the roster of the class changes
+_late_reports = TTLCache(config.LATE_REPORT_CACHE_TTL_SECONDS, config.LATE_REPORT_CACHE_MAX_ENTRIES)
+
 #get user id from query params
 async def get_current_user(request: Request):
     """Get user id from query parameters"""
@@ -62,10 +75,12 @@ async def create_class(class_data: dict, current_user: str = Depends(get_current
             "description": class_data.get("description", ""),
             "teacherId": current_user,
             "students": [],
+            "enrolledEmails": [],
             "createdAt": datetime.now().isoformat()
         }
 
-        class_ref.set(class_doc)
+        teacher_stats_service.record_class_created(current_user, class_ref.id,
+                                                   writes=[("set", class_ref, class_doc)])
         print(f"Class created successfully")
 
         return {
@@ -119,7 +134,11 @@ async def add_student_to_class(class_id: str, student_data: dict, current_user:
             raise HTTPException(status_code=400, detail="Student already exists in this class")
 
         class_data["students"].append(student)
-        class_ref.update({"students": class_data["students"]})
+        class_ref.update({
+            "students": class_data["students"],
+            "enrolledEmails": class_enrolled_emails(class_data["students"])
+        })
+        invalidate_late_report(class_id)
 
         print(f"Student added successfully: {student_id}")
         return {
@@ -161,7 +180,11 @@ async def remove_student_from_class(class_id: str, student_id: str, current_user
             if len(class_data["students"]) == original_count:
                 raise HTTPException(status_code=404, detail="Student not found in class")
 
-            class_ref.update({"students": class_data["students"]})
+            class_ref.update({
+                "students": class_data["students"],
+                "enrolledEmails": class_enrolled_emails(class_data["students"])
+            })
+            invalidate_late_report(class_id)
 
         print(f"✅ Student removed successfully")
         return {"message": "Student removed successfully"}
@@ -175,7 +198,8 @@ async def remove_student_from_class(class_id: str, student_id: str, current_user
         raise HTTPException(status_code=500, detail=f"Failed to remove student: {str(e)}")
 
 @router.post("/teacher/assignments")
-async def create_assignment(assignment_data: dict, current_user: str = Depends(get_current_user)):
+async def create_assignment(assignment_data: dict, background_tasks: BackgroundTasks,
+                            current_user: str = Depends(get_current_user)):
     """Create new assignment for a class"""
     try:
         print(f"Creating assignment for teacher: {current_user}")
@@ -199,11 +223,13 @@ async def create_assignment(assignment_data: dict, current_user: str = Depends(g
 
         print(f"📝 Saving assignment to Firebase: {assignment_doc}")
 
-        assignment_ref.set(assignment_doc)
+        teacher_stats_service.record_assignment_created(current_user, writes=[("set", assignment_ref, assignment_doc)])
+        invalidate_late_report(assignment_doc["classId"])
         print(f"Assignment created successfully: {assignment_ref.id}")
 
-        # CREATE NOTIFICATIONS FOR STUDENTS
-        await create_student_notifications(
+        # CREATE NOTIFICATIONS FOR STUDENTS (after the response is sent)
+        background_tasks.add_task(
+            create_student_notifications,
             class_id=assignment_data.get("classId"),
             assignment_id=assignment_ref.id,
             assignment_title=assignment_data.get("title"),
@@ -244,8 +270,11 @@ async def get_class_assignments(class_id: str, current_user: str = Depends(get_c
         print(f"Error fetching assignments: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch assignments: {str(e)}")
 
-async def create_student_notifications(class_id: str, assignment_id: str, assignment_title: str, due_date: str):
-    """Create notifications for all students in a class when assignment is created"""
+def create_student_notifications(class_id: str, assignment_id: str, assignment_title: str, due_date: str):
+    """
+    Create notifications for all students in a class when assignment is created.
+    Runs as a background task, the notifications are written in batches of 500.
+    """
     try:
         # Get class details
         class_ref = __db.collection("classes").document(class_id)
@@ -258,9 +287,12 @@ async def create_student_notifications(class_id: str, assignment_id: str, assign
         class_data = class_doc.to_dict()
         students = class_data.get("students", [])
 
-        # Create notifications for each student
+        # One notification per student, committed in chunks
+        notifications_ref = __db.collection("student_notifications")
+        created_at = datetime.now().isoformat()
+        writes = []
         for student in students:
-            notification_ref = __db.collection("student_notifications").document()
+            notification_ref = notifications_ref.document()
             notification_data = {
                 "id": notification_ref.id,
                 "studentEmail": student.get("email"),
@@ -271,17 +303,21 @@ async def create_student_notifications(class_id: str, assignment_id: str, assign
                 "message": f"New assignment: {assignment_title}. Due: {due_date}",
                 "dueDate": due_date,
                 "isSeen": False,
-                "createdAt": datetime.now().isoformat()
+                "createdAt": created_at
             }
-            notification_ref.set(notification_data)
-            print(f"Created notification for student: {student.get('email')}")
+            writes.append(("set", notification_ref, notification_data))
+
+        timings = bulk_write(writes, f"Assignment {assignment_id} notifications")
+        print(f"Created {len(writes)} notifications for class {class_id}")
+        return timings
 
     except Exception as e:
         print(f"Error creating student notifications: {str(e)}")
 
 @router.get("/teacher/download-pdf/{submission_id}")
-async def download_submission_pdf(submission_id: str, current_user: str = Depends(get_current_user)):
-    """Download PDF for a specific submission (for teachers)"""
+async def download_submission_pdf(submission_id: str, range: Optional[str] = Header(None),
+                                  current_user: str = Depends(get_current_user)):
+    """Download PDF for a specific submission (for teachers), streamed with Range support"""
     try:
         submission_ref = __db.collection("submissions").document(submission_id)
         submission_doc = submission_ref.get()
@@ -289,18 +325,10 @@ async def download_submission_pdf(submission_id: str, current_user: str = Depend
         if not submission_doc.exists:
             raise HTTPException(status_code=404, detail="Submission not found")
 
-        submission_data = submission_doc.to_dict()
-        pdf_base64 = submission_data.get("pdfBase64")
-
-        if not pdf_base64:
-            raise HTTPException(status_code=404, detail="PDF not found")
-
-        return {
-            "file_name": submission_data.get("fileName", "submission.pdf"),
-            "file_content": pdf_base64,
-            "content_type": "application/pdf"
-        }
+        return submission_pdf_response(submission_doc.to_dict(), range)
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error downloading PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to download PDF: {str(e)}")
@@ -311,13 +339,14 @@ async def get_assignment_submissions(assignment_id: str, current_user: str = Dep
     """Get all submissions for a specific assignment"""
     try:
         submissions_ref = __db.collection("submissions")
-        query = submissions_ref.where("assignmentId", "==", assignment_id)
+        query = submissions_ref.where("assignmentId", "==", assignment_id).select(SUBMISSION_LIST_FIELDS)
         docs = query.stream()
 
         submissions = []
         for doc in docs:
             submission_data = doc.to_dict()
             submission_data["id"] = doc.id
+            submission_data.setdefault("hasPdf", True)
             submissions.append(submission_data)
 
         # Get assignment details
@@ -374,7 +403,11 @@ async def grade_submission(grade_data: dict, current_user: str = Depends(get_cur
             "gradedBy": current_user
         }
 
-        submission_ref.update(updates)
+        if submission_doc.to_dict().get("status") != "graded":
+            teacher_stats_service.record_submission_graded(current_user, writes=[("update", submission_ref, updates)])
+        else:
+            # Regrading does not count as another graded submission
+            submission_ref.update(updates)
 
         # Create graded notification for student
         submission_data = submission_doc.to_dict()
@@ -396,6 +429,8 @@ async def grade_submission(grade_data: dict, current_user: str = Depends(get_cur
         if assignment_doc.exists:
             assignment_data = assignment_doc.to_dict()
             notification_data["assignmentTitle"] = assignment_data.get("title", "Assignment")
+            invalidate_late_report(assignment_data.get("classId"))
+        invalidate_late_report(submission_data.get("classId"))
 
         notification_ref.set(notification_data)
 
@@ -462,6 +497,7 @@ async def send_student_reminder(reminder_data: dict, current_user: str = Depends
                 "firstReminderAt": datetime.now().isoformat(),
                 "lastReminderAt": datetime.now().isoformat()
             })
+        invalidate_late_report(assignment_data.get("classId"))
 
         return {
             "message": "Reminder sent successfully",
@@ -474,6 +510,18 @@ async def send_student_reminder(reminder_data: dict, current_user: str = Depends
         print(f"Error sending reminder: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to send reminder: {str(e)}")
 
+def _parse_utc(date_str: str) -> datetime:
+    """Parse an ISO date, naive dates are taken as UTC"""
+    if 'Z' in date_str:
+        return datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+    parsed = datetime.fromisoformat(date_str)
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+def invalidate_late_report(class_id: str):
+    """Drop the cached late/missing report of a class after its data changed"""
+    if class_id:
+        _late_reports.invalidate(class_id)
+
 @router.get("/teacher/late-submissions/{class_id}")
 async def get_late_submissions(class_id: str, current_user: str = Depends(get_current_user)):
     """Get late and missing submissions for a class"""
@@ -493,128 +541,126 @@ async def get_late_submissions(class_id: str, current_user: str = Depends(get_cu
         if class_data.get("teacherId") != current_user:
             raise HTTPException(status_code=403, detail="Not authorized to access this class")
 
-        # Get all assignments for this class
-        assignments_ref = __db.collection("assignments")
-        assignments_query = assignments_ref.where("classId", "==", class_id)
-        assignments_docs = assignments_query.stream()
+        report = _late_reports.get(class_id)
+        if report is None:
+            report = _build_late_report(class_id, class_data)
+            _late_reports.put(class_id, report)
 
-        late_missing_data = []
-
-        for assignment_doc in assignments_docs:
-            assignment_data = assignment_doc.to_dict()
-            assignment_data["id"] = assignment_doc.id
-
-            # Get all submissions for this assignment
-            submissions_ref = __db.collection("submissions")
-            submissions_query = submissions_ref.where("assignmentId", "==", assignment_doc.id)
-            submissions_docs = submissions_query.stream()
-
-            submitted_students = []
-            for submission_doc in submissions_docs:
-                submission_data = submission_doc.to_dict()
-                submitted_students.append(submission_data["studentEmail"])
-
-                # Check if submission is late and not graded
-                if submission_data.get("isLate") and submission_data.get("status") != "graded":
-                    # Get reminder count for this student
-                    reminder_tracking_ref = __db.collection("student_reminder_tracking").document(f"{submission_data['studentEmail']}_{assignment_doc.id}")
-                    reminder_tracking_doc = reminder_tracking_ref.get()
-                    reminder_count = reminder_tracking_doc.to_dict().get("reminderCount", 0) if reminder_tracking_doc.exists else 0
-
-                    # Calculate days late - FIXED: Handle date parsing safely
-                    try:
-                        due_date_str = assignment_data["dueDate"]
-                        submitted_date_str = submission_data["submittedAt"]
-
-                        # Parse dates safely
-                        if 'Z' in due_date_str:
-                            due_date = datetime.fromisoformat(due_date_str.replace('Z', '+00:00'))
-                        else:
-                            due_date = datetime.fromisoformat(due_date_str)
-                            if due_date.tzinfo is None:
-                                due_date = due_date.replace(tzinfo=timezone.utc)
-
-                        if 'Z' in submitted_date_str:
-                            submitted_date = datetime.fromisoformat(submitted_date_str.replace('Z', '+00:00'))
-                        else:
-                            submitted_date = datetime.fromisoformat(submitted_date_str)
-                            if submitted_date.tzinfo is None:
-                                submitted_date = submitted_date.replace(tzinfo=timezone.utc)
-
-                        days_late = (submitted_date - due_date).days
-                    except Exception as date_error:
-                        print(f"Date parsing error: {date_error}")
-                        days_late = 0  # Default to 0 if date parsing fails
-
-                    late_missing_data.append({
-                        "type": "late_submission",
-                        "studentName": submission_data["studentName"],
-                        "studentEmail": submission_data["studentEmail"],
-                        "assignmentId": assignment_doc.id,
-                        "assignmentTitle": assignment_data["title"],
-                        "className": class_data["name"],
-                        "dueDate": assignment_data["dueDate"],
-                        "submittedAt": submission_data["submittedAt"],
-                        "daysLate": days_late,
-                        "reminderCount": reminder_count,
-                        "submissionId": submission_doc.id,
-                        "status": "late"
-                    })
-
-            # Find students who haven't submitted
-            class_students = class_data.get("students", [])
-            for student in class_students:
-                if student.get("email") not in submitted_students:
-                    # Check if assignment is past due
-                    try:
-                        due_date_str = assignment_data["dueDate"]
-                        if 'Z' in due_date_str:
-                            due_date = datetime.fromisoformat(due_date_str.replace('Z', '+00:00'))
-                        else:
-                            due_date = datetime.fromisoformat(due_date_str)
-                            if due_date.tzinfo is None:
-                                due_date = due_date.replace(tzinfo=timezone.utc)
-
-                        current_date = datetime.now(timezone.utc)
-
-                        if current_date > due_date:
-                            # Get reminder count
-                            reminder_tracking_ref = __db.collection("student_reminder_tracking").document(f"{student['email']}_{assignment_doc.id}")
-                            reminder_tracking_doc = reminder_tracking_ref.get()
-                            reminder_count = reminder_tracking_doc.to_dict().get("reminderCount", 0) if reminder_tracking_doc.exists else 0
-
-                            days_late = (current_date - due_date).days
-
-                            late_missing_data.append({
-                                "type": "missing_submission",
-                                "studentName": student["name"],
-                                "studentEmail": student["email"],
-                                "assignmentId": assignment_doc.id,
-                                "assignmentTitle": assignment_data["title"],
-                                "className": class_data["name"],
-                                "dueDate": assignment_data["dueDate"],
-                                "daysLate": days_late,
-                                "reminderCount": reminder_count,
-                                "status": "missing"
-                            })
-                    except Exception as date_error:
-                        print(f"Date parsing error for missing submission: {date_error}")
-                        continue
-
-        print(f"Found {len(late_missing_data)} late/missing submissions for class {class_id}")
-
-        return {
-            "class_id": class_id,
-            "class_name": class_data["name"],
-            "late_missing_submissions": late_missing_data
-        }
+        print(f"Found {len(report['late_missing_submissions'])} late/missing submissions for class {class_id}")
+        return report
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error fetching late submissions: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to fetch late submissions: {str(e)}")
 
+def _build_late_report(class_id: str, class_data: dict) -> dict:
+    """
+    Late and missing submissions of a class from a fixed number of bulk reads:
+    the class assignments, their submissions (one "in" query per 30
+    assignments) and every needed reminder tracking doc in one get_all
+    """
+    assignments = []
+    for assignment_doc in __db.collection("assignments").where("classId", "==", class_id).stream():
+        assignment_data = assignment_doc.to_dict()
+        assignment_data["id"] = assignment_doc.id
+        assignments.append(assignment_data)
+
+    submissions_by_assignment = {assignment["id"]: [] for assignment in assignments}
+    assignment_ids = list(submissions_by_assignment)
+    submissions_ref = __db.collection("submissions")
+    for start in range(0, len(assignment_ids), FIRESTORE_IN_LIMIT):
+        query = (submissions_ref
+                 .where(filter=FieldFilter("assignmentId", "in", assignment_ids[start:start + FIRESTORE_IN_LIMIT]))
+                 .select(["assignmentId", "studentEmail", "studentName", "submittedAt", "isLate", "status"]))
+        for submission_doc in query.stream():
+            submission_data = submission_doc.to_dict()
+            submission_data["id"] = submission_doc.id
+            submissions_by_assignment[submission_data["assignmentId"]].append(submission_data)
+
+    current_date = datetime.now(timezone.utc)
+    class_students = class_data.get("students", [])
+    late_missing_data = []
+
+    for assignment_data in assignments:
+        assignment_id = assignment_data["id"]
+        submissions = submissions_by_assignment[assignment_id]
+
+        for submission_data in submissions:
+            # Late and not graded yet
+            if not submission_data.get("isLate") or submission_data.get("status") == "graded":
+                continue
+
+            try:
+                days_late = (_parse_utc(submission_data["submittedAt"]) - _parse_utc(assignment_data["dueDate"])).days
+            except Exception as date_error:
+                print(f"Date parsing error: {date_error}")
+                days_late = 0  # Default to 0 if date parsing fails
+
+            late_missing_data.append({
+                "type": "late_submission",
+                "studentName": submission_data["studentName"],
+                "studentEmail": submission_data["studentEmail"],
+                "assignmentId": assignment_id,
+                "assignmentTitle": assignment_data["title"],
+                "className": class_data["name"],
+                "dueDate": assignment_data["dueDate"],
+                "submittedAt": submission_data["submittedAt"],
+                "daysLate": days_late,
+                "reminderCount": 0,
+                "submissionId": submission_data["id"],
+                "status": "late"
+            })
+
+        # Students who haven't submitted, once the assignment is past due
+        try:
+            due_date = _parse_utc(assignment_data["dueDate"])
+        except Exception as date_error:
+            print(f"Date parsing error for missing submission: {date_error}")
+            continue
+        if current_date <= due_date:
+            continue
+
+        submitted_students = {submission_data["studentEmail"] for submission_data in submissions}
+        for student in class_students:
+            # Students added without an email cannot be reminded, skip them
+            if not student.get("email") or student["email"] in submitted_students:
+                continue
+            late_missing_data.append({
+                "type": "missing_submission",
+                "studentName": student.get("name"),
+                "studentEmail": student["email"],
+                "assignmentId": assignment_id,
+                "assignmentTitle": assignment_data["title"],
+                "className": class_data["name"],
+                "dueDate": assignment_data["dueDate"],
+                "daysLate": (current_date - due_date).days,
+                "reminderCount": 0,
+                "status": "missing"
+            })
+
+    # Reminder counts of every listed student, in one round trip
+    tracking_ref = __db.collection("student_reminder_tracking")
+    tracking_ids = list(dict.fromkeys(f"{item['studentEmail']}_{item['assignmentId']}" for item in late_missing_data))
+    reminder_counts = {}
+    if tracking_ids:
+        for tracking_doc in __db.get_all([tracking_ref.document(doc_id) for doc_id in tracking_ids],
+                                         field_paths=["reminderCount"]):
+            if tracking_doc.exists:
+                reminder_counts[tracking_doc.id] = tracking_doc.to_dict().get("reminderCount", 0)
+
+    for item in late_missing_data:
+        item["reminderCount"] = reminder_counts.get(f"{item['studentEmail']}_{item['assignmentId']}", 0)
+
+    return {
+        "class_id": class_id,
+        "class_name": class_data["name"],
+        "late_missing_submissions": late_missing_data
+    }
+
 
 
 @router.post("/teacher/events")
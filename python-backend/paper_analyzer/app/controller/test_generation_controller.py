@@ -3,12 +3,16 @@ from typing import List, Dict
 import traceback
 
 from firebase_admin import db
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from google.cloud.firestore_v1 import FieldFilter
 from app.config.firebase_connection import FirebaseConnector
 
 from app.model.test_models import TestGenerationRequest, GeneratedTest, QuestionType
 from app.service.frequency_analyizer import connector
 from app.service.test_generation_service import TestGenerationService
+from app.service import teacher_stats_service
+from app.controller.teacher_controller import FIRESTORE_IN_LIMIT
+from app.model.firebase_db_model import count_questions, get_subjects, get_undocumented_subjects, reconcile_subject_counts
 
 router = APIRouter()
 
@@ -92,37 +96,6 @@ async def get_question_types():
         ]
     }
 
-@router.get("/subjects")
-async def get_all_subjects():
-    """
-    Get all available subjects from Firebase
-    """
-    try:
-        # Import your Firebase connector
-        from app.config.firebase_connection import FirebaseConnector
-        connector = FirebaseConnector()
-        db = connector.get_connection()
-
-        # Get all subjects from the 'subjects' collection
-        subjects_ref = db.collection("subjects")
-        docs = subjects_ref.stream()
-
-        subjects = []
-        for doc in docs:
-            subject_data = doc.to_dict()
-            subjects.append({
-                "id": doc.id,
-                "name": subject_data.get("name", doc.id),
-                "description": subject_data.get("description", ""),
-                "total_questions": subject_data.get("total_questions", 0)
-            })
-
-        return {"subjects": subjects}
-
-    except Exception as e:
-        print(f"Error fetching subjects: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to fetch subjects: {str(e)}")
-
 @router.get("/questions")
 async def get_questions_by_subject(subject: str = None):
     """
@@ -169,37 +142,15 @@ async def get_all_subjects():
     Get all available subjects from Firebase
     """
     try:
-        from app.config.firebase_connection import FirebaseConnector
-        connector = FirebaseConnector()
-        db = connector.get_connection()
+        #Get all subjects from the subjects collection, total_questions is kept by save_structured_questions
+        subjects = get_subjects()
 
-        #Get all subjects from the subjects collection
-        subjects_ref = db.collection("subjects")
-        docs = subjects_ref.stream()
-
-        subjects = []
-        for doc in docs:
-            subject_data = doc.to_dict()
-            subjects.append({
-                "id": doc.id,
-                "name": subject_data.get("name", doc.id),
-                "description": subject_data.get("description", ""),
-                "total_questions": subject_data.get("total_questions", 0)
-            })
-
-        #If no subjects found in subjects collection, try to extract from questions
+        #If no subjects found in subjects collection, list the ones the questions name
+        #(read only, POST /questions/reconcile-counts?discover=true creates their docs)
         if not subjects:
-            questions_ref = db.collection("questions")
-            docs = questions_ref.stream()
-
-            unique_subjects = set()
-            for doc in docs:
-                question_data = doc.to_dict()
-                subject = question_data.get("subject")
-                if subject:
-                    unique_subjects.add(subject)
-            subjects = [{"id": sub, "name": sub, "description": f"Questions for {sub}", "total_questions": 0}
-                        for sub in unique_subjects]
+            subjects = [{"id": sub, "name": sub, "description": f"Questions for {sub}",
+                         "total_questions": count_questions(sub)}
+                        for sub in sorted(get_undocumented_subjects(set()))]
 
         return {"subjects": subjects}
 
@@ -221,8 +172,8 @@ async def manual_question_upload(request: dict):
         if not questions:
             raise  HTTPException(status_code=400, detail="subject is required")
 
-        #use existing save_structured_questions function
-        from app.model.firebase_db_model import save_structured_questions
+        #use the bulk question save, it also reports the batch timings
+        from app.model.firebase_db_model import save_questions
 
         #Process each question
         processed_questions = []
@@ -240,19 +191,19 @@ async def manual_question_upload(request: dict):
                 "source_file": "Manual Entry"
             }
             processed_questions.append(processed_question)
-            print(f"Question {i+1}: {processed_question['text'][:50]}...")
 
         #Save to firebase
-        result = save_structured_questions(
+        saved = save_questions(
             questions=processed_questions,
             subject=subject,
             source_file="manual_upload"
         )
         return {
             "message": f"Successfully uploaded {len(processed_questions)} questions to {subject}",
-            "questions_uploaded": len(processed_questions),
+            "questions_uploaded": saved["saved"],
             "subject": subject,
-            "result": result
+            "result": saved["message"],
+            "batch_timings": saved["batches"]
         }
     except Exception as e:
         print(f"Manual upload failed: {str(e)}")
@@ -264,17 +215,8 @@ async def manual_question_upload(request: dict):
 async def get_total_questions_count():
     """Get total count of alll questions in the firebase"""
     try:
-        from app.config.firebase_connection import FirebaseConnector
-        connector = FirebaseConnector()
-        db = connector.get_connection()
-
-        #Count all questions in the quesstions collection
-        questions_ref = db.collection("questions")
-        docs = questions_ref.stream()
-
-        total_count = 0
-        for doc in docs:
-            total_count += 1
+        #Count aggregation, the question documents themselves are not read
+        total_count = count_questions()
 
         return {
             "total_questions": total_count,
@@ -284,6 +226,22 @@ async def get_total_questions_count():
         print(f"Error counting questions: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to count questions: {str(e)}")
 
+@router.post("/questions/reconcile-counts")
+async def reconcile_question_counts(discover: bool = Query(False)):
+    """
+    Recount subjects.total_questions from the questions collection and fix any drift.
+    discover also creates subject docs for subjects that only exist on questions.
+    """
+    try:
+        drift = reconcile_subject_counts(discover)
+        return {
+            "corrected": {subject: {"stored": stored, "actual": actual} for subject, (stored, actual) in drift.items()},
+            "message": f"Corrected {len(drift)} subject counters"
+        }
+    except Exception as e:
+        print(f"Error reconciling question counts: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to reconcile question counts: {str(e)}")
+
 @router.get("/teacher/monthly-stats")
 async def get_teacher_monthly_stats(teacher_id: str = Query(...)):
     """
@@ -291,66 +249,20 @@ async def get_teacher_monthly_stats(teacher_id: str = Query(...)):
     Returns: active class count, assignments created this month
     """
     try:
-        from app.config.firebase_connection import FirebaseConnector
-        connector = FirebaseConnector()
-        db = connector.get_connection()
-
-        #Get current month and year for filtering
         current_date = datetime.now()
-        current_month = current_date.month
-        current_year = current_date.year
+        print(f"Getting monthly stats for teacher: {teacher_id}, month: {current_date.month}/{current_date.year}")
 
-        print(f"Getting monthly stats for teacher: {teacher_id}, month: {current_month}/{current_year}")
-
-        # 1. Count teacher's active classes (all classes for now)
-        classes_ref = db.collection("classes")
-        classes_query = classes_ref.where("teacherId", "==", teacher_id)
-        classes_docs = classes_query.stream()
-
-        active_classes_count = 0
-        class_ids = []
-
-        for doc in classes_docs:
-            active_classes_count += 1
-            class_ids.append(doc.id)
-
-        # 2. Count assignments created this month by this teacher
-        assignments_ref = db.collection("assignments")
-        assignments_query = assignments_ref.where("teacherId", "==", teacher_id)
-        assignments_docs = assignments_query.stream()
-
-        monthly_assignments_count = 0
-        total_assignments_count = 0
-
-        for doc in assignments_docs:
-            assignment_data = doc.to_dict()
-            total_assignments_count += 1
-
-            # Check if assignment was created this month
-            created_at = assignment_data.get("created", "")
-            if created_at:
-                try:
-                    # Parse the created date
-                    if 'Z' in created_at:
-                        created_date = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                    else:
-                        created_date = datetime.fromisoformat(created_at)
-
-                    # Check if same month and year
-                    if created_date.month == current_month and created_date.year == current_year:
-                        monthly_assignments_count += 1
-                except Exception as date_error:
-                    print(f"Date parsing error for assignment {doc.id}: {date_error}")
-                    # If we can't parse the date, count it as current month to be safe
-                    monthly_assignments_count += 1
+        # Counters maintained on write by create_class / create_assignment / grade_submission
+        stats = teacher_stats_service.get_monthly_stats(teacher_id, current_date)
 
         return {
             "teacher_id": teacher_id,
-            "active_classes": active_classes_count,
-            "monthly_assignments": monthly_assignments_count,
-            "total_assignments": total_assignments_count,
-            "month": f"{current_month}/{current_year}",
-            "class_ids": class_ids  # Return for potential frontend use
+            "active_classes": stats["total_classes"],
+            "monthly_assignments": stats["monthly_assignments"],
+            "total_assignments": stats["total_assignments"],
+            "monthly_graded_submissions": stats["monthly_graded"],
+            "month": f"{current_date.month}/{current_date.year}",
+            "class_ids": stats["class_ids"]  # Return for potential frontend use
         }
 
     except Exception as e:
@@ -372,11 +284,10 @@ async def get_teacher_recent_engagement(teacher_id: str = Query(...), days: int
 
         # 1. Get all classes for this teacher
         classes_ref = db.collection("classes")
-        classes_query = classes_ref.where("teacherId", "==", teacher_id)
+        classes_query = classes_ref.where("teacherId", "==", teacher_id).select(["students"])
         classes_docs = classes_query.stream()
 
         total_students = 0
-        active_students = 0
         student_emails = set()
 
         for class_doc in classes_docs:
@@ -389,43 +300,31 @@ async def get_teacher_recent_engagement(teacher_id: str = Query(...), days: int
                     student_emails.add(student_email)
                     total_students += 1
 
-        # 2. Check which students submitted in last 7 days
+        # 2. Date-bounded submissions to the teacher's assignments, one "in" query
+        # per 30 assignments (needs the submissions (assignmentId, submittedAt)
+        # index in firestore.indexes.json). classId is not filtered on, it is
+        # sent by the client. submittedAt is a UTC ISO string when this backend
+        # writes it (comparing strings compares the instants) and a Timestamp
+        # when the web client does (userService.submitAssignment). A range
+        # filter only matches values of its own type, so both forms are queried
+        active_emails = set()
         if total_students > 0:
-            # Calculate cutoff date (7 days ago)
-            cutoff_date = datetime.now() - timedelta(days=days)
-
-            # Check submissions for each student
+            assignment_ids = [doc.id for doc in
+                              db.collection("assignments").where("teacherId", "==", teacher_id).select([]).stream()]
+            cutoff = datetime.now(timezone.utc) - timedelta(days=days)
             submissions_ref = db.collection("submissions")
-            for student_email in student_emails:
-                try:
-                    # Query submissions for this student in last 7 days
-                    submissions_query = submissions_ref.where("studentEmail", "==", student_email)
-                    submissions_docs = submissions_query.stream()
-
-                    for doc in submissions_docs:
-                        submission_data = doc.to_dict()
-                        submitted_at = submission_data.get("submittedAt", "")
-
-                        if submitted_at:
-                            try:
-                                # Parse submission date
-                                if 'Z' in submitted_at:
-                                    submit_date = datetime.fromisoformat(submitted_at.replace('Z', '+00:00'))
-                                else:
-                                    submit_date = datetime.fromisoformat(submitted_at)
-
-                                # Check if within last 7 days
-                                if submit_date >= cutoff_date:
-                                    active_students += 1
-                                    break  # Student is active, move to next student
-                            except Exception as date_error:
-                                print(f"Date parsing error for submission {doc.id}: {date_error}")
-                                # If we can't parse date, count as active to be safe
-                                active_students += 1
-                                break
-                except Exception as e:
-                    print(f"Error checking submissions for {student_email}: {e}")
-                    continue
+
+            for start in range(0, len(assignment_ids), FIRESTORE_IN_LIMIT):
+                for cutoff_value in (cutoff.isoformat(), cutoff):
+                    submissions_query = (submissions_ref
+                                         .where(filter=FieldFilter("assignmentId", "in",
+                                                                   assignment_ids[start:start + FIRESTORE_IN_LIMIT]))
+                                         .where(filter=FieldFilter("submittedAt", ">=", cutoff_value))
+                                         .select(["studentEmail"]))
+                    for doc in submissions_query.stream():
+                        active_emails.add(doc.to_dict().get("studentEmail"))
+
+        active_students = len(active_emails & student_emails)
 
         # Calculate engagement percentage
         engagement_percentage = 0
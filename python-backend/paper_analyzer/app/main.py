@@ -6,6 +6,9 @@ from app.controller.gemini_controller import router as gemini_router
 from app.controller.feedback_controller import router as feedback_router
 from app.controller.student_controller import router as student_router
 from app.controller.teacher_controller import router as teacher_router
+from app.service.model_registry import ModelRegistry
+from app.service.task_executor import ingestion_executor, document_executor
+from app.model.firebase_db_model import backfill_class_enrollments
 from fastapi.middleware.cors import  CORSMiddleware
 
 app = FastAPI(title="EduGen-AI Backend", version="1.0.0")
@@ -29,10 +32,23 @@ app.include_router(feedback_router,prefix="/api/v1")
 app.include_router(student_router, prefix="/api/v1", tags=["students"])
 app.include_router(teacher_router, prefix="/api/v1")
 
+@app.on_event("startup")
+async def backfill_indexes():
+    # One-off: classes created before the enrolledEmails membership index
+    try:
+        backfill_class_enrollments()
+    except Exception as error:
+        print(f"⚠️ enrolledEmails backfill failed: {error}")
+
 @app.get("/")
 async def root():
     return {"message": "EduGen-AI Backend API", "status": "running"}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "EduGen-AI Backend"}
\ No newline at end of file
+    return {
+        "status": "healthy",
+        "service": "EduGen-AI Backend",
+        "ai_model": ModelRegistry().get_stats(),
+        "executors": [ingestion_executor.get_stats(), document_executor.get_stats()]
+    }
\ No newline at end of file
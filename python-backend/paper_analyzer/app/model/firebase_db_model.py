@@ -3,6 +3,12 @@ from google.cloud.firestore_v1 import FieldFilter
 from app.config.firebase_connection import FirebaseConnector
 from firebase_admin import firestore
 import datetime
+import time
+import hashlib
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import app.config.server_config as config
 
 connector = FirebaseConnector()
 __db = connector.get_connection()
@@ -11,53 +17,90 @@ def save_structured_questions(questions: list, subject: str, source_file: str):
     """
     Save structured questions to Firebase
     """
+    return save_questions(questions, subject, source_file)["message"]
+
+def save_questions(questions: list, subject: str, source_file: str) -> dict:
+    """
+    Save structured questions to Firebase, returns {"saved", "message", "batches"}
+    with the latency of every committed batch
+    """
     try:
         print(f"🔥 Starting Firebase save for {len(questions)} questions to subject: {subject}")
 
-        batch = __db.batch()
-
-        # First, ensure subject document exists
-        subject_ref = __db.collection("subjects").document(subject)
-        batch.set(subject_ref, {
-            "name": subject.replace("-", " ").title(),
-            "description": f"Past papers and questions for {subject}",
-            "total_questions": firestore.Increment(len(questions)),
-            "last_updated": firestore.SERVER_TIMESTAMP
-        }, merge=True)
-
+        # Ids are fixed per save, so a retried chunk overwrites its own documents
+        save_id = uuid.uuid4().hex
+        questions_ref = __db.collection("questions")
+        writes = []
         for i, question_data in enumerate(questions):
-            # Create question document
-            question_ref = __db.collection("questions").document()
-
-            # Add subject reference and metadata
-            question_data["subject"] = subject
-            question_data["source_file"] = source_file
-            question_data["created_at"] = firestore.SERVER_TIMESTAMP
-
-            #Add source tracking (extracted vs AI-generated)
-            if "source" not in question_data:
-                question_data["source"] = "extracted" #Default for existing questions
-
-            #Ensure correct_answer feild exists (can be empty)
-            if "correct_answer" not in question_data:
-                question_data["correct_answer"] = ""
+            question_id = hashlib.sha256(f"{subject}|{source_file}|{save_id}|{i}".encode("utf-8")).hexdigest()[:20]
+            writes.append(("set", questions_ref.document(question_id), _question_document(question_data, subject, source_file)))
+
+        try:
+            timings = bulk_write(writes, f"Questions for '{subject}'", workers=config.QUESTION_WRITE_WORKERS,
+                                 retries=config.QUESTION_WRITE_RETRIES)
+        except BulkWriteError as error:
+            # All or nothing: a retried upload gets a new save_id, so the chunks
+            # that did make it in would otherwise stay behind as duplicates
+            _discard_chunks(writes, error.committed, subject)
+            raise
+        # The subject counter is only bumped once all questions are in
+        _count_subject_questions(subject, len(writes))
+
+        total_ms = round(sum(timing["ms"] for timing in timings), 1)
+        result_msg = f"Successfully saved {len(questions)} structured questions to subject '{subject}'"
+        print(f"✅ {result_msg} ({len(timings)} batches, {total_ms} ms of commits)")
 
-            batch.set(question_ref, question_data)
-            source_type = question_data.get("source", "extracted")
-            print(f"  📝 Question {i+1} ({source_type}): {question_data['text'][:50]}...")
+        # Fold the new questions into the precomputed frequency clusters
+        from app.service.frequency_index import update_frequency_index
+        try:
+            update_frequency_index(subject, [(q["text"], source_file) for q in questions])
+        except Exception as error:
+            print(f"⚠️ Frequency index update failed for '{subject}': {error}")
 
-        # Commit batch
-        batch.commit()
-        result_msg = f"Successfully saved {len(questions)} structured questions to subject '{subject}'"
-        print(f"✅ {result_msg}")
-        return result_msg
+        return {"saved": len(questions), "message": result_msg, "batches": timings}
 
     except Exception as error:
         error_msg = f"Saving failed: {str(error)}"
         print(f"❌ {error_msg}")
         import traceback
         traceback.print_exc()
-        return error_msg
+        return {"saved": 0, "message": error_msg, "batches": []}
+
+def _discard_chunks(writes: list, chunks: list, subject: str, chunk_size: int = 500):
+    """
+    Delete the documents of the given (0-based) bulk_write chunks
+    """
+    deletes = [("delete", ref, None)
+               for number in chunks
+               for _, ref, _ in writes[number * chunk_size:(number + 1) * chunk_size]]
+    if deletes:
+        print(f"🧹 Removing {len(deletes)} questions of a failed save to '{subject}'")
+        try:
+            bulk_write(deletes, f"Failed save to '{subject}'", retries=config.QUESTION_WRITE_RETRIES,
+                       continue_on_error=True)
+        except BulkWriteError as error:
+            print(f"⚠️ Could not remove every question of the failed save to '{subject}': {error}")
+
+def _count_subject_questions(subject: str, added: int):
+    __db.collection("subjects").document(subject).set({
+        "name": subject.replace("-", " ").title(),
+        "description": f"Past papers and questions for {subject}",
+        "total_questions": firestore.Increment(added),
+        "last_updated": firestore.SERVER_TIMESTAMP
+    }, merge=True)
+
+def _question_document(question_data: dict, subject: str, source_file: str):
+    # A copy, the caller's question dicts are left untouched
+    return {
+        **question_data,
+        "subject": subject,
+        "source_file": source_file,
+        "created_at": firestore.SERVER_TIMESTAMP,
+        #Add source tracking (extracted vs AI-generated), default for existing questions
+        "source": question_data.get("source", "extracted"),
+        #Ensure correct_answer feild exists (can be empty)
+        "correct_answer": question_data.get("correct_answer", "")
+    }
 
 def get_questions_by_subject(subject: str, limit: int = 50):
     """
@@ -136,6 +179,344 @@ def get_all_questions_and_sources():
         print(f"Error fetching questions: {error}")
         return []
 
+#number of questions, overall or for one subject, from a count aggregation (no documents are read)
+def count_questions(subject: str = None):
+    query = __db.collection("questions")
+    if subject is not None:
+        query = query.where(filter=FieldFilter("subject", "==", subject))
+    return query.count().get()[0][0].value
+
+def get_subjects():
+    subjects = []
+    for doc in __db.collection("subjects").select(["name", "description", "total_questions"]).stream():
+        subject_data = doc.to_dict()
+        subjects.append({
+            "id": doc.id,
+            "name": subject_data.get("name", doc.id),
+            "description": subject_data.get("description", ""),
+            "total_questions": subject_data.get("total_questions", 0)
+        })
+    return subjects
+
+def reconcile_subject_counts(discover: bool = False):
+    """
+    Repair drift between subjects.total_questions and the questions collection.
+
+    Every subject doc is recounted with a count aggregation. With discover,
+    the subject field of every question is scanned too, so subjects whose
+    doc is missing get one. The difference is applied as an Increment, so a
+    save that bumps the counter meanwhile is not overwritten. Returns the
+    subjects whose counter changed (subject -> (stored, actual)).
+    """
+    subjects_ref = __db.collection("subjects")
+    stored = {doc.id: doc.to_dict().get("total_questions")
+              for doc in subjects_ref.select(["total_questions"]).stream()}
+    missing = get_undocumented_subjects(set(stored)) if discover else set()
+
+    writes = []
+    drift = {}
+    for subject in [*stored, *sorted(missing)]:
+        total = stored.get(subject)
+        actual = count_questions(subject)
+        if total == actual:
+            continue
+        drift[subject] = (total, actual)
+        data = {"total_questions": firestore.Increment(actual - (total or 0)),
+                "last_reconciled": firestore.SERVER_TIMESTAMP}
+        if subject in missing:
+            data["name"] = subject.replace("-", " ").title()
+            data["description"] = f"Past papers and questions for {subject}"
+        writes.append(("merge", subjects_ref.document(subject), data))
+
+    _commit_writes(writes)
+    print(f"🔢 Reconciled question counts of {len(stored) + len(missing)} subjects, {len(drift)} corrected")
+    return drift
+
+#subjects that have questions but no subjects doc, the questions are only scanned when the counts disagree
+def get_undocumented_subjects(known: set):
+    if count_questions() == sum(count_questions(subject) for subject in known):
+        return set()
+    return get_question_subjects() - set(known)
+
+#every subject that has questions, from a scan of the subject field
+def get_question_subjects():
+    subjects = set()
+    for doc in __db.collection("questions").select(["subject"]).stream():
+        subject = doc.to_dict().get("subject")
+        if subject:
+            subjects.add(subject)
+    return subjects
+
+#return the precomputed frequency clusters, for one subject or all of them
+def get_frequency_clusters(subject: str = None):
+    query = __db.collection("frequency_clusters")
+    if subject is not None:
+        query = query.where(filter=FieldFilter("subject", "==", subject))
+
+    clusters = []
+    for doc in query.stream():
+        data = doc.to_dict()
+        data["id"] = doc.id
+        clusters.append(data)
+
+    return clusters
+
+#subjects whose frequency clusters were built (subject -> True/False), one frequency_index doc per indexed subject
+def get_frequency_index_state(subject: str = None):
+    state_ref = __db.collection("frequency_index")
+    if subject is not None:
+        return {subject: state_ref.document(subject).get().exists}
+
+    return {doc.id: True for doc in state_ref.select([]).stream()}
+
+def update_frequency_clusters(subject: str, new_clusters: list, matched: dict, merged_ids: list = ()):
+    """
+    Write the result of an incremental frequency index update.
+
+    Args:
+        new_clusters: cluster dicts for questions that matched no representative
+        matched: cluster id -> (added count, list of source files)
+        merged_ids: clusters folded into another cluster, they are deleted
+    """
+    clusters_ref = __db.collection("frequency_clusters")
+    writes = []
+
+    for cluster in new_clusters:
+        writes.append(("set", clusters_ref.document(), {
+            **cluster,
+            "subject": subject,
+            "updated_at": firestore.SERVER_TIMESTAMP
+        }))
+
+    for cluster_id, (added, source_files) in matched.items():
+        writes.append(("update", clusters_ref.document(cluster_id), {
+            "count": firestore.Increment(added),
+            "source_files": firestore.ArrayUnion(source_files),
+            "updated_at": firestore.SERVER_TIMESTAMP
+        }))
+
+    for cluster_id in merged_ids:
+        writes.append(("delete", clusters_ref.document(cluster_id), None))
+
+    _commit_writes(writes)
+
+def replace_frequency_clusters(subject: str, clusters: list):
+    """
+    Replace every frequency cluster of a subject and mark the subject as
+    indexed in frequency_index. A subject without clusters (no questions) is
+    left unmarked.
+    """
+    clusters_ref = __db.collection("frequency_clusters")
+    old_refs = [doc.reference for doc in
+                clusters_ref.where(filter=FieldFilter("subject", "==", subject)).select([]).stream()]
+
+    writes = [("delete", ref, None) for ref in old_refs]
+    for cluster in clusters:
+        writes.append(("set", clusters_ref.document(), {
+            **cluster,
+            "subject": subject,
+            "updated_at": firestore.SERVER_TIMESTAMP
+        }))
+    state_ref = __db.collection("frequency_index").document(subject)
+    if clusters:
+        writes.append(("set", state_ref, {"subject": subject, "indexed_at": firestore.SERVER_TIMESTAMP}))
+    else:
+        writes.append(("delete", state_ref, None))
+
+    _commit_writes(writes)
+
+def _commit_writes(writes: list, chunk_size: int = 450):
+    # Firestore batches hold at most 500 writes
+    for start in range(0, len(writes), chunk_size):
+        _commit_batch(writes[start:start + chunk_size])
+
+def _commit_batch(writes: list):
+    batch = __db.batch()
+    for operation, ref, data in writes:
+        if operation == "set":
+            batch.set(ref, data)
+        elif operation == "merge":
+            batch.set(ref, data, merge=True)
+        elif operation == "update":
+            batch.update(ref, data)
+        else:
+            batch.delete(ref)
+    batch.commit()
+
+class BulkWriteError(Exception):
+    """
+    A chunk of a bulk_write still failed after its retries.
+    committed lists the (0-based) chunks that did make it in.
+    """
+    def __init__(self, message: str, committed: list, timings: list):
+        super().__init__(message)
+        self.committed = committed
+        self.timings = timings
+        self.written = sum(timing["writes"] for timing in timings)
+
+def bulk_write(writes: list, label: str, chunk_size: int = 500, workers: int = 1, retries: int = 0,
+               continue_on_error: bool = False):
+    """
+    Commit (operation, ref, data) writes in batches of up to 500, up to
+    `workers` batches at a time, logging every chunk's latency.
+
+    A failed chunk is committed again up to `retries` times, which is only
+    safe for idempotent writes (set / merge / delete on known document ids).
+    Once a chunk has failed for good no further chunk is started (chunks
+    already running finish), unless continue_on_error is set.
+    Returns [{"chunk", "writes", "ms", "attempts"}] in chunk order, raises
+    BulkWriteError on failure.
+    """
+    chunks = [writes[start:start + chunk_size] for start in range(0, len(writes), chunk_size)]
+    failed = threading.Event()
+
+    def commit_chunk(number):
+        if failed.is_set() and not continue_on_error:
+            return None
+        chunk = chunks[number]
+        for attempt in range(retries + 1):
+            started = time.perf_counter()
+            try:
+                _commit_batch(chunk)
+            except Exception as error:
+                if attempt == retries:
+                    print(f"❌ {label}: chunk {number + 1}/{len(chunks)} failed after {attempt + 1} attempts: {error}")
+                    failed.set()
+                    raise
+                print(f"⚠️ {label}: chunk {number + 1}/{len(chunks)} failed, retrying: {error}")
+                time.sleep(0.5 * 2 ** attempt)
+                continue
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            print(f"📦 {label}: chunk {number + 1}/{len(chunks)} committed {len(chunk)} writes in {elapsed_ms} ms")
+            return {"chunk": number + 1, "writes": len(chunk), "ms": elapsed_ms, "attempts": attempt + 1}
+
+    outcomes = []
+    if workers <= 1 or len(chunks) <= 1:
+        for number in range(len(chunks)):
+            try:
+                outcomes.append(commit_chunk(number))
+            except Exception as error:
+                outcomes.append(error)
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            futures = [pool.submit(commit_chunk, number) for number in range(len(chunks))]
+            outcomes = [future.exception() or future.result() for future in futures]
+
+    timings = [outcome for outcome in outcomes if isinstance(outcome, dict)]
+    errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+    if errors:
+        committed = [timing["chunk"] - 1 for timing in timings]
+        raise BulkWriteError(f"{len(errors)} of {len(chunks)} chunks failed: {errors[0]}", committed, timings)
+    return timings
+
+#class membership index: classes carry enrolledEmails next to students for array_contains queries
+def class_enrolled_emails(students: list):
+    return sorted({student.get("email") for student in students if student.get("email")})
+
+def backfill_class_enrollments(force: bool = False):
+    """
+    Add enrolledEmails to classes created before the membership index existed.
+    Runs once, a marker document records that the backfill is done.
+    """
+    marker_ref = __db.collection("migrations").document("class_enrolled_emails")
+    if not force and marker_ref.get().exists:
+        return 0
+
+    writes = []
+    for doc in __db.collection("classes").select(["students", "enrolledEmails"]).stream():
+        data = doc.to_dict()
+        enrolled = class_enrolled_emails(data.get("students", []))
+        if data.get("enrolledEmails") != enrolled:
+            writes.append(("update", doc.reference, {"enrolledEmails": enrolled}))
+    writes.append(("set", marker_ref, {"completed_at": firestore.SERVER_TIMESTAMP, "updated": len(writes)}))
+
+    _commit_writes(writes)
+    print(f"👥 Backfilled enrolledEmails on {len(writes) - 1} classes")
+    return len(writes) - 1
+
+#teacher stats: a totals doc "{teacherId}" and one doc per month "{teacherId}_{YYYY-MM}"
+def increment_teacher_stats(teacher_id: str, month: str, counters: dict, class_id: str = None, writes: list = ()):
+    """
+    Atomically add counters (name -> delta) to a teacher's totals and monthly
+    stats docs, in the same batch as `writes` (the class, assignment or
+    submission write being counted), so one never lands without the other
+    """
+    stats_ref = __db.collection("teacher_stats")
+    totals = {name: firestore.Increment(delta) for name, delta in counters.items()}
+    if class_id:
+        totals["classIds"] = firestore.ArrayUnion([class_id])
+
+    _commit_batch([
+        *writes,
+        ("merge", stats_ref.document(teacher_id), {**totals, "teacherId": teacher_id}),
+        ("merge", stats_ref.document(f"{teacher_id}_{month}"), {
+            **{name: firestore.Increment(delta) for name, delta in counters.items()},
+            "teacherId": teacher_id,
+            "month": month
+        })
+    ])
+
+def get_teacher_stats(teacher_id: str, month: str):
+    """
+    (totals, monthly) stats docs of a teacher, None for a missing doc
+    """
+    stats_ref = __db.collection("teacher_stats")
+    docs = {doc.id: doc for doc in __db.get_all([stats_ref.document(teacher_id),
+                                                 stats_ref.document(f"{teacher_id}_{month}")])}
+    totals, monthly = docs.get(teacher_id), docs.get(f"{teacher_id}_{month}")
+    return (totals.to_dict() if totals and totals.exists else None,
+            monthly.to_dict() if monthly and monthly.exists else None)
+
+def replace_teacher_stats(teacher_id: str, count_history):
+    """
+    Overwrite every stats doc of a teacher with count_history(transaction),
+    which returns (totals, monthly: month -> counters).
+
+    Runs in a transaction that reads the totals doc first. Every increment
+    also writes that doc, so an increment either lands before the history is
+    counted (and is part of it) or waits for the rebuild and is added on
+    top. Readers see the old or the new stats, never a mix.
+    """
+    stats_ref = __db.collection("teacher_stats")
+    totals_ref = stats_ref.document(teacher_id)
+
+    def rebuild(transaction):
+        totals_ref.get(transaction=transaction)
+        old_refs = [doc.reference for doc in
+                    stats_ref.where(filter=FieldFilter("teacherId", "==", teacher_id)).select([])
+                    .stream(transaction=transaction)]
+        totals, monthly = count_history(transaction)
+
+        monthly_refs = {stats_ref.document(f"{teacher_id}_{month}").id for month in monthly}
+        for ref in old_refs:
+            if ref.id != teacher_id and ref.id not in monthly_refs:
+                transaction.delete(ref)
+        transaction.set(totals_ref, {**totals, "teacherId": teacher_id})
+        for month, counters in monthly.items():
+            transaction.set(stats_ref.document(f"{teacher_id}_{month}"), {
+                **counters,
+                "teacherId": teacher_id,
+                "month": month
+            })
+
+    _transactional(rebuild)(__db.transaction())
+
+def _transactional(to_wrap):
+    # The in-memory stand-in brings its own, firestore.transactional needs a real client
+    transactional = getattr(__db, "transactional", None) or firestore.transactional
+    return transactional(to_wrap)
+
+#ingest registry: one document per (file hash, subject, isPaper) already processed
+def get_ingested_file(ingest_key: str):
+    doc = __db.collection("ingested_files").document(ingest_key).get()
+    return doc.to_dict() if doc.exists else None
+
+def save_ingested_file(ingest_key: str, data: dict):
+    __db.collection("ingested_files").document(ingest_key).set({
+        **data,
+        "processed_at": firestore.SERVER_TIMESTAMP
+    })
+
 def save_mock_test_feed_back(data: dict, user: str):
     """
     Save mock test feedback to Firebase Firestore
@@ -1,30 +1,14 @@
 import fitz  # PyMuPDF
 import os, re
-import app.config.server_config as config
-from ctransformers import AutoModelForCausalLM
+from app.service.model_registry import ModelRegistry
 
 # Global variables
 _questions = []
 __chunkSize = 9
 
-# Load Mistral model
-base_dir = os.path.dirname(__file__)
-model_path = os.path.abspath(os.path.join(base_dir, "..", "..", "resources", "mistral-7b-instruct-v0.1.Q4_K_S.gguf"))
-
-if config.USE_CPU_FOR_AI:
-    model = AutoModelForCausalLM.from_pretrained(
-        model_path,
-        model_type="mistral",
-        local_files_only=True
-    )
-    print("Model running on - CPU")
-else:
-    model = AutoModelForCausalLM.from_pretrained(
-        model_path,
-        model_type="mistral",
-        gpu_layers=15
-    )
-    print("Model running on - GPU")
+# Shared Mistral model (loaded once per process, reused by every service)
+model = ModelRegistry().get_model()
+scheduler = ModelRegistry().get_scheduler()
 
 import time
 
@@ -37,6 +21,8 @@ def extractCoreLogic(cleaned_questions):
     start_time = time.time()
     final_core_logics = []
 
+    # Queue every prompt first so the scheduler can batch them
+    pending_responses = []
     for q in cleaned_questions:
         # Build a precise instruction prompt
         prompt = f"""
@@ -54,7 +40,10 @@ def extractCoreLogic(cleaned_questions):
 
             Output:
             """
-        response = model(prompt)   # <-- your AI model call
+        pending_responses.append(scheduler.submit(prompt))
+
+    for pending_response in pending_responses:
+        response = pending_response.result()   # <-- your AI model call
 
         # Post-processing
         lines = response.strip().splitlines()
@@ -0,0 +1,128 @@
+import os
+import shutil
+import threading
+from typing import Iterator
+import app.config.server_config as config
+
+try:
+    import boto3
+except ImportError:  # Only needed for BLOB_STORE_BACKEND = "s3"
+    boto3 = None
+
+READ_CHUNK_SIZE = 256 * 1024
+
+
+class BlobNotFoundError(Exception):
+    pass
+
+
+class LocalBlobStore:
+    """
+    Content-addressed blobs on the local filesystem: a blob is stored once
+    under its SHA-256 (fanned out as ab/cd/<sha256>) and read back in chunks
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root_dir, key[:2], key[2:4], key)
+
+    def put_file(self, path: str, sha256: str) -> str:
+        """
+        Store a copy of the file at `path` as blob `sha256` and return its key
+        """
+        target = self._path(sha256)
+        if os.path.exists(target):
+            return sha256
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = f"{target}.{threading.get_ident()}.partial"
+        shutil.copyfile(path, partial)
+        os.replace(partial, target)
+        return sha256
+
+    def size(self, key: str) -> int:
+        try:
+            return os.path.getsize(self._path(key))
+        except FileNotFoundError:
+            raise BlobNotFoundError(key)
+
+    def iter_range(self, key: str, start: int, end: int) -> Iterator[bytes]:
+        """
+        Bytes start..end (inclusive) of the blob, in chunks
+        """
+        try:
+            blob = open(self._path(key), "rb")
+        except FileNotFoundError:
+            raise BlobNotFoundError(key)
+
+        with blob:
+            blob.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = blob.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+class S3BlobStore:
+    """
+    Content-addressed blobs in an S3 bucket (or any S3-compatible store via
+    endpoint_url), read back with ranged GETs
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str = None):
+        if boto3 is None:
+            raise RuntimeError("boto3 is required for BLOB_STORE_BACKEND = \"s3\"")
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def put_file(self, path: str, sha256: str) -> str:
+        if not self._exists(sha256):
+            self._client.upload_file(path, self.bucket, self._object_key(sha256))
+        return sha256
+
+    def _exists(self, key: str) -> bool:
+        try:
+            self.size(key)
+            return True
+        except BlobNotFoundError:
+            return False
+
+    def size(self, key: str) -> int:
+        try:
+            head = self._client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self._client.exceptions.ClientError:
+            raise BlobNotFoundError(key)
+        return head["ContentLength"]
+
+    def iter_range(self, key: str, start: int, end: int) -> Iterator[bytes]:
+        try:
+            response = self._client.get_object(Bucket=self.bucket, Key=self._object_key(key),
+                                               Range=f"bytes={start}-{end}")
+        except self._client.exceptions.NoSuchKey:
+            raise BlobNotFoundError(key)
+        yield from response["Body"].iter_chunks(READ_CHUNK_SIZE)
+
+
+_blob_store = None
+_blob_store_lock = threading.Lock()
+
+
+def get_blob_store():
+    global _blob_store
+    with _blob_store_lock:
+        if _blob_store is None:
+            if config.BLOB_STORE_BACKEND == "s3":
+                _blob_store = S3BlobStore(config.BLOB_S3_BUCKET, config.BLOB_S3_PREFIX, config.BLOB_S3_ENDPOINT_URL)
+            else:
+                _blob_store = LocalBlobStore(config.BLOB_STORE_DIR)
+        return _blob_store
@@ -0,0 +1,257 @@
+import argparse
+import threading
+from contextlib import ExitStack
+from collections import defaultdict
+from typing import List, Tuple
+from rapidfuzz import process, fuzz
+from app.model.firebase_db_model import (
+    get_questions_and_sources,
+    get_frequency_clusters,
+    get_frequency_index_state,
+    get_question_subjects,
+    count_questions,
+    update_frequency_clusters,
+    replace_frequency_clusters
+)
+from app.service.question_clustering import sort_tokens, cluster_subjects, summarise_subjects
+import app.config.server_config as config
+
+# One writer per subject at a time, so two saves never create the same cluster twice
+# (reentrant: an update of a subject that was never indexed rebuilds it)
+_subject_locks = defaultdict(threading.RLock)
+_subject_locks_guard = threading.Lock()
+
+# (questions counted, questions in the clusters) when the questions were last scanned for unindexed subjects
+_scanned_totals = None
+
+
+def _subject_lock(subject: str):
+    with _subject_locks_guard:
+        return _subject_locks[subject]
+
+
+def update_frequency_index(subject: str, questions_and_sources: List[Tuple[str, str]], similarity_threshold=90):
+    """
+    Fold newly saved questions into the subject's frequency clusters.
+
+    Each question joins every cluster whose representative it matches
+    (token sort ratio >= similarity_threshold), clusters joined by the same
+    question are merged into the oldest one, and a question that matches
+    nothing starts a new cluster. A subject that was never indexed is built
+    from its full history instead.
+
+    Unlike rebuild_frequency_index, new questions are only compared with the
+    cluster representatives, not with every stored question, so the clusters
+    can drift slightly from a full rebuild; rebuild_all_frequency_indexes
+    (python -m app.service.frequency_index) brings them back in line.
+    """
+    if not questions_and_sources:
+        return
+
+    with _subject_lock(subject):
+        if not get_frequency_index_state(subject).get(subject):
+            rebuild_frequency_index(subject, similarity_threshold)
+            return
+
+        # Index order is position order, so the lowest index of a group is its oldest cluster
+        clusters = sorted(get_frequency_clusters(subject), key=lambda c: c.get("position", 0))
+        representatives = [cluster["sorted_text"] for cluster in clusters]
+        next_position = max((cluster.get("position", 0) for cluster in clusters), default=-1) + 1
+
+        # Stored clusters followed by the clusters started by this save
+        entries = [{"count": cluster["count"], "source_files": list(cluster.get("source_files", []))}
+                   for cluster in clusters]
+        parent = list(range(len(entries)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for text, source_file in questions_and_sources:
+            sorted_text = sort_tokens(text)
+            matches = process.extract(sorted_text, representatives, scorer=fuzz.ratio,
+                                      score_cutoff=similarity_threshold, limit=None)
+
+            if not matches:
+                entries.append({
+                    "question": text,
+                    "sorted_text": sorted_text,
+                    "count": 0,
+                    "source_files": [],
+                    "position": next_position
+                })
+                representatives.append(sorted_text)
+                parent.append(len(parent))
+                next_position += 1
+                root = len(entries) - 1
+            else:
+                roots = {find(choice_id) for _, _, choice_id in matches}
+                root = min(roots)
+                for other in roots:
+                    parent[other] = root
+
+            entries[root]["count"] += 1
+            if source_file not in entries[root]["source_files"]:
+                entries[root]["source_files"].append(source_file)
+
+        # Fold every merged cluster into the root of its group
+        merged_ids = []
+        for i in range(len(entries)):
+            root = find(i)
+            if root == i:
+                continue
+            entries[root]["count"] += entries[i]["count"]
+            for source_file in entries[i]["source_files"]:
+                if source_file not in entries[root]["source_files"]:
+                    entries[root]["source_files"].append(source_file)
+            if i < len(clusters):
+                merged_ids.append(clusters[i]["id"])
+
+        matched = {}
+        for i, cluster in enumerate(clusters):
+            added = entries[i]["count"] - cluster["count"]
+            if find(i) == i and added:
+                matched[cluster["id"]] = (added, entries[i]["source_files"])
+        new_clusters = [entries[i] for i in range(len(clusters), len(entries)) if find(i) == i]
+
+        update_frequency_clusters(subject, new_clusters, matched, merged_ids)
+        print(f"📊 Frequency index '{subject}': {len(matched)} clusters grown, {len(new_clusters)} new, "
+              f"{len(merged_ids)} merged")
+
+
+def rebuild_frequency_index(subject: str, similarity_threshold=90) -> list:
+    """
+    Recluster every stored question of a subject and replace its frequency clusters
+    """
+    clusters = _rebuild_subjects([subject], similarity_threshold)[subject]
+    print(f"📊 Rebuilt frequency index '{subject}': {len(clusters)} clusters")
+    return clusters
+
+
+def rebuild_all_frequency_indexes(similarity_threshold=90, processes: int = None):
+    """
+    Backfill the frequency clusters of every subject from the questions collection
+    """
+    subjects = set(get_frequency_index_state()) | get_question_subjects()
+    rebuilt = _rebuild_subjects(subjects, similarity_threshold, processes)
+    print(f"📊 Rebuilt frequency index of {len(rebuilt)} subjects")
+
+
+def _rebuild_subjects(subjects, similarity_threshold=90, processes: int = None) -> dict:
+    """
+    Recluster the stored questions of several subjects at once and replace
+    their frequency clusters, returns subject -> clusters.
+
+    The subjects are clustered together with cluster_subjects, so a large
+    backfill (or one large subject) is spread over the analysis process pool.
+    Their locks are held from reading the questions to writing the clusters.
+    """
+    subjects = sorted(set(subjects))
+    with ExitStack() as locks:
+        # Always taken in sorted order, so two rebuilds cannot deadlock
+        for subject in subjects:
+            locks.enter_context(_subject_lock(subject))
+
+        results = cluster_subjects(
+            {subject: get_questions_and_sources(subject) for subject in subjects},
+            similarity_threshold,
+            processes=config.ANALYSIS_PROCESS_WORKERS if processes is None else processes,
+            min_parallel_pairs=config.ANALYSIS_PARALLEL_MIN_PAIRS
+        )
+
+        rebuilt = {}
+        for subject, analysis in results.items():
+            rebuilt[subject] = _clusters_from_analysis(analysis)
+            replace_frequency_clusters(subject, rebuilt[subject])
+    return rebuilt
+
+
+def get_subject_frequency_analysis(subject: str) -> list:
+    """
+    Frequency analysis of one subject read from its precomputed clusters,
+    [] for a subject without questions
+    """
+    if not get_frequency_index_state(subject).get(subject):
+        return clusters_to_analysis(rebuild_frequency_index(subject))
+
+    return clusters_to_analysis(get_frequency_clusters(subject))
+
+
+def get_all_subjects_frequency_analysis() -> dict:
+    """
+    Frequency analysis of every subject read from the precomputed clusters,
+    in the same shape as frequency_analyizer.analyse_all_subjects
+    """
+    clusters = get_frequency_clusters()
+    # Subjects that were never indexed are clustered together, see _rebuild_subjects
+    unindexed = _unindexed_subjects(clusters)
+    if unindexed:
+        _rebuild_subjects(unindexed)
+        clusters = get_frequency_clusters()
+
+    by_subject = defaultdict(list)
+    for cluster in clusters:
+        by_subject[cluster["subject"]].append(cluster)
+
+    return summarise_subjects({
+        subject: clusters_to_analysis(clusters) for subject, clusters in by_subject.items()
+    })
+
+
+def _unindexed_subjects(clusters: list) -> list:
+    """
+    Subjects that have questions but no frequency index (saved before the
+    index existed). Every question is in exactly one cluster, so the index
+    is complete when the cluster counts add up to the question count: that
+    costs one count aggregation. Only a mismatch scans the questions' subject
+    field, and a mismatch that was already scanned (drift inside indexed
+    subjects, see update_frequency_index) is not scanned again.
+    """
+    global _scanned_totals
+    totals = (count_questions(), sum(cluster["count"] for cluster in clusters))
+    if totals[0] == totals[1] or totals == _scanned_totals:
+        return []
+
+    _scanned_totals = totals
+    indexed = get_frequency_index_state()
+    return sorted(subject for subject in get_question_subjects() if not indexed.get(subject))
+
+
+def clusters_to_analysis(clusters: list) -> list:
+    """
+    Turn stored clusters into the count / percentage / source_files list
+    """
+    total_questions = sum(cluster["count"] for cluster in clusters)
+    analysis = []
+    for cluster in sorted(clusters, key=lambda c: (-c["count"], c.get("position", 0))):
+        percent = round((cluster["count"] / total_questions) * 100, 2)
+        analysis.append({
+            "question": cluster["question"],
+            "count": cluster["count"],
+            "percentage": percent,
+            "source_files": list(cluster.get("source_files", [])),
+            "likelihood": percent
+        })
+    return analysis
+
+
+def _clusters_from_analysis(analysis: list) -> list:
+    return [{
+        "question": item["question"],
+        "sorted_text": sort_tokens(item["question"]),
+        "count": item["count"],
+        "source_files": item["source_files"],
+        "position": position
+    } for position, item in enumerate(analysis)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the precomputed frequency clusters from the questions")
+    parser.add_argument("--subject", help="only rebuild this subject")
+    args = parser.parse_args()
+    if args.subject:
+        rebuild_frequency_index(args.subject)
+    else:
+        rebuild_all_frequency_indexes()
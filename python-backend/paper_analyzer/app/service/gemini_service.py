@@ -4,6 +4,7 @@ import re,json
 from app.service.pdf_service import read_mock_test_papers
 from app.config.server_config import GEMINI_API_KEY as GEMINI_API_KEY
 from app.model.firebase_db_model import save_mock_test_feed_back
+from app.service.task_executor import ExecutorSaturatedError
 
 async def start_gemini_chat(prompt:str):
     try:
@@ -85,6 +86,8 @@ async def start_grading(userid,file:UploadFile):
         return res
 
 
+    except ExecutorSaturatedError:
+        raise
     except Exception as error:
         print(f"Error grading {error}")
         return (f"gemini-service Error grading{error}")
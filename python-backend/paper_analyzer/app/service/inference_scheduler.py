@@ -0,0 +1,168 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import app.config.server_config as config
+
+
+class _InferenceRequest:
+    __slots__ = ("prompt", "params", "future", "queued_at", "cache_key")
+
+    def __init__(self, prompt: str, params: dict, cache_key: str = None):
+        self.prompt = prompt
+        self.params = params
+        self.future = Future()
+        self.queued_at = time.perf_counter()
+        self.cache_key = cache_key
+
+    def key(self):
+        return self.prompt, tuple(sorted(self.params.items()))
+
+
+class InferenceScheduler:
+    """
+    Collects prompts from every request into micro-batches and runs them
+    on one model from a single worker thread.
+
+    A batch is closed when it reaches max_batch_size prompts or when
+    max_wait_ms has passed since its first prompt arrived. Identical prompts
+    (same text and generation params) inside a batch are generated only once.
+    Callers get a concurrent.futures.Future back from submit().
+
+    With an LLMCache attached, prompts that were generated before (same
+    model hash, prompt and params) resolve immediately without queueing.
+    """
+
+    def __init__(self, model, max_batch_size: int = None, max_wait_ms: int = None, name: str = "llm",
+                 cache=None, model_hash: str = None):
+        self.model = model
+        self.cache = cache
+        self.model_hash = model_hash
+        self.max_batch_size = max(1, max_batch_size or config.LLM_MAX_BATCH_SIZE)
+        self.max_wait = (config.LLM_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "batches": 0,
+            "prompts": 0,
+            "generated": 0,
+            "cancelled": 0,
+            "cache_hits": 0,
+            "failed": 0,
+            "max_batch": 0,
+            "busy_seconds": 0.0,
+        }
+
+    def submit(self, prompt: str, **params) -> Future:
+        """
+        Queue a prompt and return a Future that resolves to the model output
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(self.model_hash, prompt, params)
+            completion = self.cache.get(cache_key)
+            if completion is not None:
+                with self._stats_lock:
+                    self._stats["cache_hits"] += 1
+                future = Future()
+                future.set_result(completion)
+                return future
+
+        self._ensure_worker()
+        request = _InferenceRequest(prompt, params, cache_key)
+        self._queue.put(request)
+        return request.future
+
+    def generate(self, prompt: str, **params) -> str:
+        """
+        Queue a prompt and block until its output is ready
+        """
+        return self.submit(prompt, **params).result()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["pending"] = self.pending()
+        stats["avg_batch"] = round(stats["prompts"] / stats["batches"], 2) if stats["batches"] else 0
+        stats["busy_seconds"] = round(stats["busy_seconds"], 2)
+        return stats
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name=f"{self.name}-inference", daemon=True
+                )
+                self._worker.start()
+
+    def _next_batch(self) -> list:
+        # Block until the first prompt arrives, then wait at most max_wait for more
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+
+            # Drop prompts whose caller already gave up on them
+            live = [request for request in batch if request.future.set_running_or_notify_cancel()]
+
+            groups = {}
+            for request in live:
+                groups.setdefault(request.key(), []).append(request)
+
+            generated = failed = 0
+            for requests in groups.values():
+                first = requests[0]
+                try:
+                    response = self.model(first.prompt, **first.params)
+                    generated += 1
+                except Exception as error:
+                    print(f"❌ Inference failed: {error}")
+                    failed += 1
+                    for request in requests:
+                        request.future.set_exception(error)
+                    continue
+
+                if self.cache is not None and first.cache_key:
+                    try:
+                        self.cache.put(first.cache_key, response)
+                    except Exception as error:
+                        print(f"⚠️ Could not cache LLM output: {error}")
+
+                for request in requests:
+                    request.future.set_result(response)
+
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                self._stats["prompts"] += len(batch)
+                self._stats["generated"] += generated
+                self._stats["failed"] += failed
+                self._stats["cancelled"] += len(batch) - len(live)
+                self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+                self._stats["busy_seconds"] += time.perf_counter() - started
+
+            if len(batch) > 1:
+                print(f"🤖 Inference batch: {len(batch)} prompts, {generated} generated "
+                      f"in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Optional, Tuple
+from app.model.firebase_db_model import get_ingested_file, save_ingested_file
+
+
+class IngestRegistry:
+    """
+    Remembers which PDFs were already ingested, keyed by the SHA-256 of the
+    file bytes plus subject and isPaper, so a re-upload of the same file
+    returns the earlier result instead of running the pipeline (and saving
+    the questions) again.
+
+    Finished ingests are stored in the ingested_files collection. Uploads of
+    the same file that are still running in this process are tracked
+    in memory, a second copy waits for the first one's result (on the event
+    loop or through a callback, never on an ingestion worker).
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(file_sha256: str, subject: str, is_paper: bool) -> str:
+        return hashlib.sha256(f"{file_sha256}|{subject}|{bool(is_paper)}".encode("utf-8")).hexdigest()
+
+    def get_result(self, ingest_key: str) -> Optional[dict]:
+        """
+        Result of an earlier ingest of the same file, marked as a duplicate
+        """
+        try:
+            record = get_ingested_file(ingest_key)
+        except Exception as error:
+            print(f"⚠️ Ingest registry lookup failed, processing the file again: {error}")
+            return None
+
+        if not record or not isinstance(record.get("result"), dict):
+            return None
+        return self._as_duplicate(record["result"], record.get("filename"), record.get("processed_at"))
+
+    def claim(self, ingest_key: str) -> Tuple[Future, bool]:
+        """
+        Returns (future, owner). The owner runs the pipeline and must call
+        release() (or fail() if it never got to run); everyone else waits
+        on the future.
+        """
+        with self._lock:
+            future = self._in_flight.get(ingest_key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._in_flight[ingest_key] = future
+            return future, True
+
+    def release(self, ingest_key: str, result):
+        with self._lock:
+            future = self._in_flight.pop(ingest_key, None)
+        if future is not None:
+            future.set_result(result)
+
+    def fail(self, ingest_key: str, error: BaseException):
+        with self._lock:
+            future = self._in_flight.pop(ingest_key, None)
+        if future is not None:
+            future.set_exception(error)
+
+    async def wait_for(self, future: Future, filename: str = None):
+        """
+        Result of the in-flight ingest behind future, awaited on the event loop
+        """
+        return self.duplicate_of(await asyncio.wrap_future(future), filename)
+
+    @classmethod
+    def duplicate_of(cls, result, filename: str = None):
+        return cls._as_duplicate(result, filename) if isinstance(result, dict) else result
+
+    def record(self, ingest_key: str, file_sha256: str, size: int, filename: str, subject: str,
+               is_paper: bool, result):
+        # Only successful ingests are remembered, failures can simply be retried
+        if not isinstance(result, dict) or str(result.get("message", "")).startswith("Saving failed"):
+            return
+
+        try:
+            save_ingested_file(ingest_key, {
+                "file_sha256": file_sha256,
+                "size": size,
+                "filename": filename,
+                "subject": subject,
+                "isPaper": is_paper,
+                "result": result
+            })
+        except Exception as error:
+            print(f"⚠️ Could not record ingest of {filename}: {error}")
+
+    @staticmethod
+    def _as_duplicate(result: dict, filename: str = None, processed_at=None) -> dict:
+        duplicate = dict(result)
+        duplicate["duplicate"] = True
+        duplicate["original_filename"] = filename
+        if processed_at is not None:
+            duplicate["processed_at"] = processed_at
+        return duplicate
+
+
+ingest_registry = IngestRegistry()
@@ -0,0 +1,96 @@
+import threading
+import time
+import uuid
+from typing import Optional
+import app.config.server_config as config
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+FINISHED_STATES = (COMPLETED, FAILED)
+
+
+class LocalJobStore:
+    """
+    In-process store for PDF ingestion jobs.
+
+    Every update bumps the job's version so pollers and the SSE stream can
+    tell when something changed. Finished jobs are dropped after
+    JOB_RETENTION_SECONDS.
+    """
+
+    def __init__(self, retention_seconds: int = None):
+        self.retention_seconds = retention_seconds or config.JOB_RETENTION_SECONDS
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, filename: str, subject: str, is_paper: bool) -> dict:
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": QUEUED,
+            "stage": "queued",
+            "filename": filename,
+            "subject": subject,
+            "isPaper": is_paper,
+            "queue_position": 0,
+            "progress": {
+                "pages_parsed": 0,
+                "total_pages": None,
+                "chunks_generated": 0,
+                "total_chunks": None,
+                "questions_saved": 0
+            },
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "version": 0
+        }
+
+        with self._lock:
+            self._prune_locked(now)
+            self._jobs[job["job_id"]] = job
+            return self._copy(job)
+
+    def update(self, job_id: str, progress: Optional[dict] = None, **fields) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+
+            if progress:
+                job["progress"].update(progress)
+            job.update(fields)
+            job["updated_at"] = time.time()
+            job["version"] += 1
+            return self._copy(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._copy(job) if job else None
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _prune_locked(self, now: float):
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] in FINISHED_STATES and now - job["updated_at"] > self.retention_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _copy(job: dict) -> dict:
+        copied = dict(job)
+        copied["progress"] = dict(job["progress"])
+        return copied
+
+
+job_store = LocalJobStore()
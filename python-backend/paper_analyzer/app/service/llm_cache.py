@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+import app.config.server_config as config
+
+# Hits whose last_used update is held in memory before one write stores them all
+TOUCH_FLUSH_SIZE = 256
+
+
+class LLMCache:
+    """
+    Persistent prompt -> completion cache stored in SQLite.
+
+    Entries are keyed by the model fingerprint, the prompt text and the
+    generation params (max_new_tokens, temperature, ...). The cache is
+    bounded by total completion size and evicts least recently used entries.
+    A hit only records its time in memory, the last_used column is updated
+    in one write per TOUCH_FLUSH_SIZE hits or before the next put, so reads
+    never wait for a commit.
+    """
+
+    def __init__(self, db_path: str = None, max_bytes: int = None):
+        self.db_path = db_path or os.path.join(config.CACHE_DIR, "llm_cache.sqlite")
+        self.max_bytes = max_bytes or config.LLM_CACHE_MAX_MB * 1024 * 1024
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                cache_key TEXT PRIMARY KEY,
+                completion TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS completions_last_used ON completions(last_used)")
+        self._connection.commit()
+
+        self._total_bytes = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM completions"
+        ).fetchone()[0]
+        self._touched = {}  # cache_key -> time of the last hit not written yet
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def fingerprint_model(model_path: str) -> str:
+        """
+        Fingerprint of the model file from its name, size and mtime. Hashing
+        a multi-GB GGUF would hold up the first start; a replaced or
+        re-downloaded file gets a new mtime and so a new fingerprint.
+        """
+        stat = os.stat(model_path)
+        key_data = f"{os.path.basename(model_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_key(model_hash: str, prompt: str, params: dict) -> str:
+        key_data = {
+            "model": model_hash,
+            "prompt": prompt,
+            "max_new_tokens": params.get("max_new_tokens"),
+            "temperature": params.get("temperature"),
+            # Any other generation option also changes the output
+            "params": sorted((k, v) for k, v in params.items() if k not in ("max_new_tokens", "temperature"))
+        }
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, cache_key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT completion FROM completions WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._touched[cache_key] = time.time()
+            if len(self._touched) >= TOUCH_FLUSH_SIZE:
+                self._flush_touched_locked()
+                self._connection.commit()
+            return row[0]
+
+    def _flush_touched_locked(self):
+        if self._touched:
+            self._connection.executemany(
+                "UPDATE completions SET last_used = ? WHERE cache_key = ?",
+                [(last_used, cache_key) for cache_key, last_used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def put(self, cache_key: str, completion: str):
+        size = len(completion.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            old = self._connection.execute(
+                "SELECT size FROM completions WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO completions (cache_key, completion, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (cache_key, completion, size, now, now)
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            # Eviction goes by last_used, so the recent hits are written first
+            self._flush_touched_locked()
+            self._evict_locked()
+            self._connection.commit()
+
+    def _evict_locked(self):
+        # Drop least recently used completions until the cache fits again
+        while self._total_bytes > self.max_bytes:
+            rows = self._connection.execute(
+                "SELECT cache_key, size FROM completions ORDER BY last_used ASC LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+
+            for cache_key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._connection.execute("DELETE FROM completions WHERE cache_key = ?", (cache_key,))
+                self._total_bytes -= size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._connection.execute("DELETE FROM completions")
+            self._connection.commit()
+            self._total_bytes = 0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "size_mb": round(self._total_bytes / (1024 * 1024), 2),
+                "max_size_mb": round(self.max_bytes / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,177 @@
+import os
+import sys
+import threading
+import time
+import app.config.server_config as config
+from ctransformers import AutoModelForCausalLM
+from app.service.inference_scheduler import InferenceScheduler
+from app.service.llm_cache import LLMCache
+
+# Folder that holds the GGUF model files
+MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "resources"))
+
+
+def resolve_model_path(model_file: str) -> str:
+    """
+    Return the absolute path of a model file inside the resources folder
+    """
+    if os.path.isabs(model_file):
+        return model_file
+    return os.path.join(MODEL_DIR, model_file)
+
+
+def get_resident_memory_mb():
+    """
+    Resident memory (RSS) of this process in MB, or None if it can't be read
+    """
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / (1024 * 1024), 1)
+    except ImportError:
+        pass
+
+    # Linux fallback without psutil
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/statm") as statm:
+                resident_pages = int(statm.read().split()[1])
+            return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+        except (OSError, ValueError, IndexError):
+            pass
+
+    return None
+
+
+class ModelRegistry:
+    """
+    Process-wide registry that loads every GGUF model at most once and
+    hands the same instance to every service that asks for it.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ModelRegistry, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, '_models'):
+            self._models = {}
+            self._schedulers = {}
+            self._cache = None
+            self._stats = {}
+            self._load_lock = threading.Lock()
+
+    def get_model(self, model_file: str = config.MODEL_FILE):
+        """
+        Return the loaded model for model_file, loading it on first use
+        """
+        model_path = resolve_model_path(model_file)
+
+        model = self._models.get(model_path)
+        if model is not None:
+            return model
+
+        # Only one thread loads a given file, the others wait and reuse it
+        with self._load_lock:
+            model = self._models.get(model_path)
+            if model is None:
+                model = self._load(model_path)
+                self._models[model_path] = model
+
+        return model
+
+    def get_scheduler(self, model_file: str = config.MODEL_FILE) -> InferenceScheduler:
+        """
+        Return the shared micro-batching scheduler in front of model_file
+        """
+        model_path = resolve_model_path(model_file)
+
+        scheduler = self._schedulers.get(model_path)
+        if scheduler is not None:
+            return scheduler
+
+        model = self.get_model(model_file)
+        with self._load_lock:
+            scheduler = self._schedulers.get(model_path)
+            if scheduler is None:
+                cache = model_hash = None
+                if config.LLM_CACHE_ENABLED:
+                    cache = self.get_cache()
+                    model_hash = cache.fingerprint_model(model_path)
+
+                scheduler = InferenceScheduler(
+                    model,
+                    name=os.path.splitext(os.path.basename(model_path))[0],
+                    cache=cache,
+                    model_hash=model_hash
+                )
+                self._schedulers[model_path] = scheduler
+
+        return scheduler
+
+    def get_cache(self) -> LLMCache:
+        """
+        Return the shared persistent LLM output cache
+        """
+        if self._cache is None:
+            self._cache = LLMCache()
+        return self._cache
+
+    def _load(self, model_path: str):
+        rss_before = get_resident_memory_mb()
+        start_time = time.perf_counter()
+
+        if config.USE_CPU_FOR_AI:
+            device = "CPU"
+            model = AutoModelForCausalLM.from_pretrained(
+                model_path,
+                model_type=config.MODEL_TYPE,
+                local_files_only=True,
+                context_length=config.MODEL_CONTEXT_LENGTH
+            )
+        else:
+            device = "GPU"
+            model = AutoModelForCausalLM.from_pretrained(
+                model_path,
+                model_type=config.MODEL_TYPE,
+                gpu_layers=config.MODEL_GPU_LAYERS,
+                context_length=config.MODEL_CONTEXT_LENGTH
+            )
+
+        load_seconds = round(time.perf_counter() - start_time, 2)
+        rss_after = get_resident_memory_mb()
+
+        self._stats[model_path] = {
+            "model_file": os.path.basename(model_path),
+            "device": device,
+            "load_seconds": load_seconds,
+            "rss_before_mb": rss_before,
+            "rss_after_mb": rss_after,
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+
+        print(f"🧠 Loaded {os.path.basename(model_path)} on {device} in {load_seconds}s "
+              f"(RSS {rss_before} MB -> {rss_after} MB)")
+        return model
+
+    def is_loaded(self, model_file: str = config.MODEL_FILE) -> bool:
+        return resolve_model_path(model_file) in self._models
+
+    def get_stats(self) -> dict:
+        """
+        Load time and memory figures for every loaded model, plus current RSS
+        """
+        models = []
+        for model_path, stats in self._stats.items():
+            stats = dict(stats)
+            scheduler = self._schedulers.get(model_path)
+            if scheduler is not None:
+                stats["inference"] = scheduler.get_stats()
+            models.append(stats)
+
+        return {
+            "resident_memory_mb": get_resident_memory_mb(),
+            "models": models,
+            "llm_cache": self._cache.get_stats() if self._cache is not None else None
+        }
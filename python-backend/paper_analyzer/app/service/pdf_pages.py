@@ -0,0 +1,258 @@
+import hashlib
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+import fitz
+import app.config.server_config as config
+
+# Separator the pipeline historically put between page texts
+PAGE_BREAK = "\n--- Page Break ---\n"
+PAGE_BREAK_LINE = PAGE_BREAK.strip("\n")
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class SpooledUpload:
+    """
+    An upload written to a temp file, with its size and sha256
+    """
+
+    def __init__(self, path: str, size: int, sha256: str, filename: str = None):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.filename = filename
+
+    def cleanup(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+
+async def spool_upload(file, chunk_size: int = UPLOAD_CHUNK_SIZE) -> SpooledUpload:
+    """
+    Copy an UploadFile to a temp file chunk by chunk, never holding the whole PDF in memory
+    """
+    digest = hashlib.sha256()
+    size = 0
+    handle, path = tempfile.mkstemp(suffix=".pdf", prefix="upload-")
+    try:
+        with os.fdopen(handle, "wb") as spool:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                spool.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return SpooledUpload(path, size, digest.hexdigest(), getattr(file, "filename", None))
+
+
+_extraction_pool = None
+_extraction_pool_lock = threading.Lock()
+
+
+def _get_extraction_pool() -> ProcessPoolExecutor:
+    # Spawned (not forked) workers: the server process holds threads and the LLM
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            _extraction_pool = ProcessPoolExecutor(
+                max_workers=config.PDF_EXTRACT_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _extraction_pool
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    # Runs in a worker process, every worker opens the same spooled file
+    with fitz.open(pdf_path) as doc:
+        return [doc.load_page(page_number).get_text() for page_number in range(start, end)]
+
+
+class PdfPages:
+    """
+    Re-iterable page texts of a PDF on disk.
+
+    PyMuPDF opens the file itself (no bytes copy in Python) and each page's
+    text is extracted once, on first use, then kept in an on-disk text spool
+    so later passes (cleaning, chunking, fallbacks) read it back page by page.
+    Meant to be used from one thread at a time.
+    """
+
+    def __init__(self, pdf_path: str, on_page: Optional[Callable[[int, str], None]] = None):
+        self.pdf_path = pdf_path
+        self.on_page = on_page
+        self._doc = fitz.open(pdf_path)
+        self.page_count = self._doc.page_count
+        self._spool = tempfile.TemporaryFile()
+        self._offsets = []  # (offset, length) of every extracted page in the spool
+
+    def __len__(self):
+        return self.page_count
+
+    def __iter__(self) -> Iterator[str]:
+        for page_number in range(self.page_count):
+            if page_number < len(self._offsets):
+                yield self._read_page(page_number)
+            else:
+                yield self._extract_page(page_number)
+
+    def _extract_page(self, page_number: int) -> str:
+        return self._store_page(page_number, self._doc.load_page(page_number).get_text())
+
+    def _store_page(self, page_number: int, text: str) -> str:
+        encoded = text.encode("utf-8", "surrogatepass")
+
+        self._spool.seek(0, os.SEEK_END)
+        self._offsets.append((self._spool.tell(), len(encoded)))
+        self._spool.write(encoded)
+
+        if self.on_page:
+            self.on_page(page_number, text)
+        return text
+
+    def _read_page(self, page_number: int) -> str:
+        offset, length = self._offsets[page_number]
+        self._spool.seek(offset)
+        return self._spool.read(length).decode("utf-8", "surrogatepass")
+
+    def extract_all(self, processes: int = None) -> "PdfPages":
+        """
+        Extract every page now (e.g. to report parsing progress up front).
+
+        Documents with at least PDF_PARALLEL_MIN_PAGES pages are cut into
+        page ranges that worker processes extract in parallel; the texts are
+        stored back in page order.
+        """
+        processes = config.PDF_EXTRACT_PROCESSES if processes is None else processes
+        remaining = self.page_count - len(self._offsets)
+
+        if processes > 1 and remaining >= config.PDF_PARALLEL_MIN_PAGES:
+            self._extract_parallel()
+
+        for _ in self:
+            pass
+        return self
+
+    def _extract_parallel(self):
+        pool = _get_extraction_pool()
+        first = len(self._offsets)
+        shard_size = config.PDF_PAGES_PER_SHARD
+        shards = [
+            (start, min(start + shard_size, self.page_count))
+            for start in range(first, self.page_count, shard_size)
+        ]
+        futures = [pool.submit(_extract_page_range, self.pdf_path, start, end) for start, end in shards]
+
+        try:
+            # Reassemble in page order, later shards keep running meanwhile
+            for (start, _end), future in zip(shards, futures):
+                for page_number, text in enumerate(future.result(), start):
+                    self._store_page(page_number, text)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def close(self):
+        self._doc.close()
+        self._spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_pages(content: Union[str, Iterable[str]]) -> Iterator[str]:
+    """
+    Page texts of either a joined text (split on PAGE_BREAK) or an iterable of pages
+    """
+    if isinstance(content, str):
+        return iter(content.split(PAGE_BREAK))
+    return iter(content)
+
+
+def iter_lines(content: Union[str, Iterable[str]]) -> Iterator[str]:
+    """
+    The lines content.split('\\n') would give for the joined text, produced
+    page by page (the page break shows up as its own line)
+    """
+    if isinstance(content, str):
+        yield from content.split("\n")
+        return
+
+    for page_number, page in enumerate(content):
+        if page_number:
+            yield PAGE_BREAK_LINE
+        yield from page.split("\n")
+
+
+def iter_joined(content: Union[str, Iterable[str]]) -> Iterator[str]:
+    """
+    Consecutive pieces of the joined text, concatenating them gives
+    PAGE_BREAK.join(pages)
+    """
+    if isinstance(content, str):
+        yield content
+        return
+
+    for page_number, page in enumerate(content):
+        if page_number:
+            yield PAGE_BREAK
+        yield page
+
+
+def iter_split(content: Union[str, Iterable[str]], pattern: str) -> Iterator[str]:
+    """
+    re.split(pattern, joined_text) produced lazily, so callers can stop early.
+    A separator touching the end of the buffered text is held back until the
+    next piece arrives, in case it continues there.
+    """
+    regex = re.compile(pattern)
+    buffer = ""
+    for piece in iter_joined(content):
+        buffer += piece
+        start = 0
+        for match in regex.finditer(buffer):
+            if match.end() == len(buffer):
+                break
+            yield buffer[start:match.start()]
+            start = match.end()
+        buffer = buffer[start:]
+
+    yield from regex.split(buffer)
+
+
+def text_head(content: Union[str, Iterable[str]], length: int) -> str:
+    """
+    First `length` characters of the joined text
+    """
+    if isinstance(content, str):
+        return content[:length]
+
+    head = []
+    remaining = length
+    for piece in iter_joined(content):
+        head.append(piece[:remaining])
+        remaining -= len(head[-1])
+        if remaining <= 0:
+            break
+    return "".join(head)
@@ -1,12 +1,135 @@
 import re
-_questionsList = []
+from typing import List
+from app.service.pdf_pages import iter_pages
+
+# Patterns to remove marks
+_MARKS_PATTERN = re.compile(
+    r'\(marks?\s*\d+\)|'          # (marks 20), (mark 5)
+    r'\[marks?\s*\d+\]|'          # [marks 20], [mark 5]
+    r'\(\d+\s*marks?\)|'          # (20 marks), (5 mark)
+    r'\[\d+\s*marks?\]|'          # [20 marks], [5 mark]
+    r'\b\d+\s*marks?\b|'          # 20 marks, 5 mark
+    r'Marks?\s*:\s*\d+|'          # Marks: 20, Mark: 5
+    r'\(Maximum\s*Marks?\s*:\s*\d+\)|'  # (Maximum Marks: 20)
+    r'\[?Total\s*Marks\s*[-–]\]?|'
+    r'Total\s*Marks?\s*:\s*\d+',  # Total Marks: 20
+    re.IGNORECASE
+)
+
+# Page break pattern
+_PAGE_BREAK_PATTERN = re.compile(
+    r'-{2,}\s*Page\s*Break\s*-{2,}|'
+    r'^\s*\d+\s*\|\s*P\s*a\s*g\s*e\s*$',
+    re.IGNORECASE)
+
+
+# Every "drop this line" rule of normalizePdfQuestions in one pattern (used with .match):
+#   page numbers ("Page 3", "Page 3 of 10", "3/10"), bare numbers,
+#   dataset headers and numeric data lines like "81, 56, 35"
+_SKIP_LINE_PATTERN = re.compile(
+    r'(?:Page\s*\d+\s*(?:of\s*\d+)?|\d+\s*/\s*\d+)$|'
+    r'(?:Time|Branch|Products|Sales|Quantity|Dimension|Product|Ti|W\d+)\b|'
+    r'[\d,\.\-][\d,\.\-\s]*$',
+    re.IGNORECASE
+)
+
+# Enhanced pattern for question detection
+_QUESTION_START_PATTERN = re.compile(r"""
+    ^(?:
+        Question\s+No\.?\s*\d+          |  # "Question No 1", "Question No.1"
+        \b\d+[\.\)]\s+                  |  # "1. ", "1) "
+        \(\d+\)\s+                      |  # "(1) "
+        [a-z]\)\s+                      |  # "a) "
+        [ivx]+\.\s+                     |  # "i. ", "ii. "
+        \b[Qq]\.?\s*\d+\.?\s*          |  # "Q1", "Q.1", "q1"
+        Question\s*:?\s*               |  # "Question:", "Question"
+        Part\s+[A-Z]\s+                |  # "Part A"
+        Section\s+[A-Z]\s+             |  # "Section A"
+        \b[A-D]\.\s+                   |  # "A. ", "B. " (for MCQs)
+        \bANSWER\s+THE\s+FOLLOWING     |  # "ANSWER THE FOLLOWING"
+        \b[A-Z][A-Z\s]+\:               # Uppercase headings followed by colon
+    )
+""", re.MULTILINE | re.IGNORECASE | re.VERBOSE)
+
+_SECTION_PATTERN = re.compile(r'(?:Section|Part)\s+[A-Z]', re.IGNORECASE)
+_PARAGRAPH_PATTERN = re.compile(r'\n\s*\n')
+
+# Common question prefixes removed by clean_single_question
+_QUESTION_PREFIX_PATTERNS = [
+    re.compile(r'^\s*Question\s*(?:No\.?\s*)?\d+\s*[:.)-]?\s*'),
+    re.compile(r'^\s*[Qq]\.?\s*\d+\s*[:.)]?\s*'),
+    re.compile(r'^\s*\d+[\.\)]\s*'),
+    re.compile(r'^\s*[a-z]\)\s*')
+]
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Final cleanup of the joined lines: reduce multiple newlines, trim whitespace
+_BLANK_LINES_PATTERN = re.compile(r'\n\s*\n\s*\n+')
+_EDGE_WHITESPACE_PATTERN = re.compile(r'^\s+|\s+$', re.MULTILINE)
+
+def _clean_junction(whitespace: str, at_start: bool = False, at_end: bool = False) -> str:
+    """
+    Apply the final cleanup to one whitespace run between two kept texts.
+
+    Both cleanup patterns only ever match whitespace, and what they do to a
+    run depends only on the run itself and on whether it starts or ends the
+    text, so the runs can be cleaned one by one. Non-whitespace sentinels
+    stand in for the neighbouring text.
+    """
+    if not whitespace:
+        return whitespace
+    if whitespace == "\n" and not at_start and not at_end:
+        return whitespace
+
+    # Why the padding gives the same result as the two passes over the
+    # whole text: neither pattern can match across non-whitespace, so every
+    # match lies inside one run. _BLANK_LINES_PATTERN only looks at the run.
+    # _EDGE_WHITESPACE_PATTERN's ^ and $ (MULTILINE) also look one character
+    # past the run: a "\n" inside the run is seen either way, so the only
+    # difference is the start/end of the text. An "x" on each side that has
+    # a neighbour stops ^ / $ from matching there, exactly as the
+    # neighbouring text would, and leaving it off the text's own start/end
+    # lets them match. Either pass only shortens the run, so "x" survives and
+    # is cut off again.
+    padded = ("" if at_start else "x") + whitespace + ("" if at_end else "x")
+    padded = _BLANK_LINES_PATTERN.sub('\n\n', padded)
+    padded = _EDGE_WHITESPACE_PATTERN.sub('', padded)
+    return padded[(0 if at_start else 1):(len(padded) if at_end else -1)]
 
 def get_clean_questions(pages):
     """
     Extract questions from pages and analyze them in chunks for core logic.
+    pages is the joined PDF text or an iterable of page texts (PdfPages).
+    Safe to call concurrently, the questions are returned, not stored.
+    """
+    cleaned_text = normalizePdfQuestions(pages)
+    questions = question_splitter.split(cleaned_text)
+    printQuestions(questions)
+    return questions
+
+def _clean_page_lines(page: str) -> List[str]:
     """
-    textGiven = normalizePdfQuestions(pages)
-    return _questionsList
+    Kept lines of one page (before the first page header is cut)
+    """
+    lines = []
+    for line in page.splitlines():
+        clean_line = line.strip()
+        if not clean_line:
+            continue
+
+        # Remove page break markers (both forms contain "--" or "|")
+        if '--' in clean_line or '|' in clean_line:
+            clean_line = _PAGE_BREAK_PATTERN.sub('', clean_line)
+
+        # Remove marks patterns (every form contains "mark")
+        if 'mark' in clean_line.lower():
+            clean_line = _MARKS_PATTERN.sub('', clean_line)
+
+        # Remove page numbers, dataset headers and numeric lines
+        if clean_line and not _SKIP_LINE_PATTERN.match(clean_line):
+            lines.append(clean_line)
+
+    return lines
 
 def normalizePdfQuestions(pages, n_header_lines=9):
     """
@@ -18,154 +141,111 @@ def normalizePdfQuestions(pages, n_header_lines=9):
     - Removes dataset lines (numbers, tables, column headers)
     - Removes other common PDF artifacts
     """
-    page_texts = pages.split("\n--- Page Break ---\n")
-    cleaned_pages = []
-
-    # Patterns to remove marks
-    marks_pattern = re.compile(
-        r'\(marks?\s*\d+\)|'          # (marks 20), (mark 5)
-        r'\[marks?\s*\d+\]|'          # [marks 20], [mark 5]
-        r'\(\d+\s*marks?\)|'          # (20 marks), (5 mark)
-        r'\[\d+\s*marks?\]|'          # [20 marks], [5 mark]
-        r'\b\d+\s*marks?\b|'          # 20 marks, 5 mark
-        r'Marks?\s*:\s*\d+|'          # Marks: 20, Mark: 5
-        r'\(Maximum\s*Marks?\s*:\s*\d+\)|'  # (Maximum Marks: 20)
-        r'\[?Total\s*Marks\s*[-–]\]?|'
-        r'Total\s*Marks?\s*:\s*\d+',  # Total Marks: 20
-        re.IGNORECASE
-    )
-
-    # Page break pattern
-    page_break_pattern = re.compile(
-        r'-{2,}\s*Page\s*Break\s*-{2,}|'
-        r'^\s*\d+\s*\|\s*P\s*a\s*g\s*e\s*$',
-          re.IGNORECASE)
-
-    # Dataset-related patterns
-    dataset_header_pattern = re.compile(
-        r'^(Time|Branch|Products|Sales|Quantity|Dimension|Product|Ti|W\d+)\b', re.IGNORECASE
-    )
-    numeric_line_pattern = re.compile(r'^([\d,\.\-]+\s*)+$')  # Lines mostly numbers, like "81, 56, 35"
+    page_texts = iter_pages(pages)
+    cleaned_parts = []
+    junction = []           # whitespace between the last kept text and the next one
+    line_count = 0
+    first_line = True
 
     for i, page in enumerate(page_texts):
-        lines = []
-        for line in page.splitlines():
-            clean_line = line.strip()
-            if not clean_line:
-                continue
-
-            # Remove page break markers
-            clean_line = page_break_pattern.sub('', clean_line)
-
-            # Remove marks patterns
-            clean_line = marks_pattern.sub('', clean_line)
-
-            # Remove common PDF artifacts
-            if re.match(r'^(Page\s*\d+\s*(of\s*\d+)?|\d+\s*/\s*\d+)$', clean_line, re.IGNORECASE):
-                continue
-            if re.match(r'^\d+$', clean_line):
-                continue
-
-            # Remove dataset headers or numeric lines
-            if dataset_header_pattern.match(clean_line):
-                continue
-            if numeric_line_pattern.match(clean_line):
-                continue
-
-            if clean_line:
-                lines.append(clean_line)
+        lines = _clean_page_lines(page)
 
         # Remove header from first page only
         if i == 0 and len(lines) > n_header_lines:
             lines = lines[n_header_lines:]
+        line_count += len(lines)
+
+        # Lines of this page as they sit in the joined text (an empty page is one empty line)
+        for clean_line in lines or [""]:
+            if not first_line:
+                junction.append("\n")
+            first_line = False
 
-        cleaned_pages.append("\n".join(lines))
+            text = clean_line.strip()
+            if not text:
+                junction.append(clean_line)
+                continue
 
-    cleaned_text = "\n".join(cleaned_pages)
+            leading = clean_line[:len(clean_line) - len(clean_line.lstrip())]
+            junction.append(leading)
+            cleaned_parts.append(_clean_junction("".join(junction), at_start=not cleaned_parts))
+            cleaned_parts.append(text)
+            junction = [clean_line[len(clean_line.rstrip()):]]
 
-    # Final cleanup pass
-    cleaned_text = re.sub(r'\n\s*\n\s*\n+', '\n\n', cleaned_text)  # Reduce multiple newlines
-    cleaned_text = re.sub(r'^\s+|\s+$', '', cleaned_text, flags=re.MULTILINE)  # Trim whitespace
+    cleaned_parts.append(_clean_junction("".join(junction), at_start=not cleaned_parts, at_end=True))
+    cleaned_text = "".join(cleaned_parts)
 
-    print(f"\nNumber of lines: {sum(len(p.splitlines()) for p in cleaned_pages)}")
+    print(f"\nNumber of lines: {line_count}")
     print(f"Number of characters: {len(cleaned_text)}")
 
-    splitQuestions(cleaned_text)
     return cleaned_text
 
 
 
-def splitQuestions(text):
+class QuestionSplitter:
     """
-    Improved question splitting with better boundary detection
+    Splits cleaned paper text into individual questions.
+
+    Holds no state between calls (patterns are module-level and compiled
+    once), so one instance can be shared by any number of threads or
+    processes.
     """
-    global _questionsList
-    _questionsList = []  # Reset before adding
-
-    # Enhanced pattern for question detection
-    pattern = re.compile(r"""
-        ^(?:                                  
-            Question\s+No\.?\s*\d+          |  # "Question No 1", "Question No.1"
-            \b\d+[\.\)]\s+                  |  # "1. ", "1) "
-            \(\d+\)\s+                      |  # "(1) "
-            [a-z]\)\s+                      |  # "a) "
-            [ivx]+\.\s+                     |  # "i. ", "ii. "
-            \b[Qq]\.?\s*\d+\.?\s*          |  # "Q1", "Q.1", "q1"
-            Question\s*:?\s*               |  # "Question:", "Question"
-            Part\s+[A-Z]\s+                |  # "Part A"
-            Section\s+[A-Z]\s+             |  # "Section A"
-            \b[A-D]\.\s+                   |  # "A. ", "B. " (for MCQs)
-            \bANSWER\s+THE\s+FOLLOWING     |  # "ANSWER THE FOLLOWING"
-            \b[A-Z][A-Z\s]+\:               # Uppercase headings followed by colon
-        )
-    """, re.MULTILINE | re.IGNORECASE | re.VERBOSE)
-
-    # Split by major sections first
-    sections = re.split(r'(?:Section|Part)\s+[A-Z]', text, flags=re.IGNORECASE)
-
-    for section in sections:
-        if not section.strip():
-            continue
 
-        matches = list(pattern.finditer(section))
+    def split(self, text: str) -> List[str]:
+        """
+        Improved question splitting with better boundary detection
+        """
+        questions = []
 
-        if not matches:
-            # If no clear questions, try to split by line breaks for very clear separations
-            potential_questions = re.split(r'\n\s*\n', section)
-            for pq in potential_questions:
-                pq = pq.strip()
-                if len(pq) > 20 and len(pq) < 500:  # Reasonable question length
-                    _questionsList.append(pq)
-            continue
+        # Split by major sections first
+        sections = _SECTION_PATTERN.split(text)
 
-        for i, match in enumerate(matches):
-            start = match.start()
-            end = matches[i + 1].start() if i + 1 < len(matches) else len(section)
-            question_text = section[start:end].strip()
+        for section in sections:
+            if not section.strip():
+                continue
 
-            # Clean the question text
-            question_text = clean_single_question(question_text)
+            matches = list(_QUESTION_START_PATTERN.finditer(section))
 
-            if is_valid_individual_question(question_text):
-                _questionsList.append(question_text)
+            if not matches:
+                # If no clear questions, try to split by line breaks for very clear separations
+                potential_questions = _PARAGRAPH_PATTERN.split(section)
+                for pq in potential_questions:
+                    pq = pq.strip()
+                    if len(pq) > 20 and len(pq) < 500:  # Reasonable question length
+                        questions.append(pq)
+                continue
 
-    printQuestions()
+            for i, match in enumerate(matches):
+                start = match.start()
+                end = matches[i + 1].start() if i + 1 < len(matches) else len(section)
+                question_text = section[start:end].strip()
+
+                # Clean the question text
+                question_text = clean_single_question(question_text)
+
+                if is_valid_individual_question(question_text):
+                    questions.append(question_text)
+
+        return questions
+
+
+question_splitter = QuestionSplitter()
+
+
+def splitQuestions(text):
+    """
+    Split cleaned text into questions, returns the list
+    """
+    return question_splitter.split(text)
 
 def clean_single_question(text):
     """Clean individual question text"""
     # Remove common prefixes
-    prefixes = [
-        r'^\s*Question\s*(?:No\.?\s*)?\d+\s*[:.)-]?\s*',
-        r'^\s*[Qq]\.?\s*\d+\s*[:.)]?\s*',
-        r'^\s*\d+[\.\)]\s*',
-        r'^\s*[a-z]\)\s*'
-    ]
-
-    for prefix in prefixes:
-        text = re.sub(prefix, '', text)
+    for prefix in _QUESTION_PREFIX_PATTERNS:
+        text = prefix.sub('', text)
 
     # Remove extra whitespace and normalize
-    text = re.sub(r'\s+', ' ', text)
+    text = _WHITESPACE_PATTERN.sub(' ', text)
     text = text.strip()
 
     return text
@@ -243,15 +323,15 @@ def is_valid_question(text):
 
 
 #for debuging
-def printQuestions():
+def printQuestions(questions):
     """
     Prints all extracted questions with numbering.
     """
     print(f"\n{'='*60}")
-    print(f"EXTRACTED QUESTIONS: {len(_questionsList)} found")
+    print(f"EXTRACTED QUESTIONS: {len(questions)} found")
     print(f"{'='*60}")
     
-    for i, question in enumerate(_questionsList, 1):
+    for i, question in enumerate(questions, 1):
         print(f"Question {i}:")
         print("-" * 40)
         # Show first 200 characters to avoid too much output
@@ -260,5 +340,5 @@ def printQuestions():
         # print(f"Length: {len(question)} characters")
     
     print(f"\n{'='*60}")
-    print(f"Total questions extracted: {len(_questionsList)}")
+    print(f"Total questions extracted: {len(questions)}")
     print(f"{'='*60}")
\ No newline at end of file
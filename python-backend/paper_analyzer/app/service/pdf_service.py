@@ -1,150 +1,177 @@
 from fastapi import UploadFile
-import fitz,re
-from io import BytesIO
+from fastapi.concurrency import run_in_threadpool
+import re
 from app.model.firebase_db_model import save_structured_questions
 from app.service.pdf_question_preparer import get_clean_questions
 from app.service.question_classifier import classify_and_structure_questions
 from app.service.question_generation_service import QuestionGenerationService  # ADD THIS
+from app.service.task_executor import ingestion_executor, document_executor, ExecutorSaturatedError
+from app.service.ingestion_jobs import job_store, RUNNING, COMPLETED, FAILED
+from app.service.pdf_pages import PdfPages, SpooledUpload, spool_upload, iter_pages
+from app.service.ingest_registry import ingest_registry
 
-async def process_pdf(isPaper: bool, file: UploadFile, subject: str):
+async def process_pdf(isPaper: bool, file: UploadFile, subject: str, force: bool = False):
     try:
         if file is not None:
-            print(f"📁 Processing PDF: {file.filename} for subject: {subject}")
+            # The upload goes to a temp file, PyMuPDF reads it from there
+            with await spool_upload(file) as upload:
+                ingest_key = ingest_registry.make_key(upload.sha256, subject, isPaper)
+
+                # Same file, subject and type already ingested: hand back that result
+                if not force:
+                    previous = await run_in_threadpool(ingest_registry.get_result, ingest_key)
+                    if previous is not None:
+                        print(f"♻️ {file.filename} was already ingested for '{subject}', returning the earlier result")
+                        return previous
+
+                # A copy of a file that is still being processed waits for that run,
+                # without taking an ingestion worker
+                future, owner = ingest_registry.claim(ingest_key)
+                if not owner:
+                    print(f"♻️ {file.filename} is already being ingested for '{subject}', waiting for that result")
+                    return await ingest_registry.wait_for(future, file.filename)
+
+                # Run the blocking pipeline on the ingestion pool, not the event loop
+                try:
+                    return await ingestion_executor.run(_ingest_pdf, ingest_key, isPaper, upload, subject)
+                except ExecutorSaturatedError as error:
+                    ingest_registry.fail(ingest_key, error)
+                    raise
 
-            contents = await file.read()
-            pdf_stream = BytesIO(contents)
-            doc = fitz.open(stream=pdf_stream, filetype="pdf")
+        return "Reading failed"
+    except ExecutorSaturatedError:
+        raise
+    except Exception as error:
+        print(f"❌ Processing failed: {str(error)}")
+        import traceback
+        traceback.print_exc()
+        return f"Processing failed: {str(error)}"
 
-            # Extract text from all pages
-            all_pages_text = []
-            for page_index, page in enumerate(doc):
-                text = page.get_text()
-                all_pages_text.append(text)
-                print(f"📄 Page {page_index + 1}: {len(text)} characters")
 
-            full_text = "\n--- Page Break ---\n".join(all_pages_text)
-            print(f"📊 Total text extracted: {len(full_text)} characters")
+async def submit_pdf_job(isPaper: bool, upload: SpooledUpload, subject: str, force: bool = False) -> dict:
+    """
+    Queue a spooled PDF for background ingestion and return the new job.
+    The job owns the upload and removes its temp file when it finishes.
+    A file that was already ingested gives a job that is completed right away,
+    one that is still being ingested gives a job that completes with that run.
+    """
+    job = None
+    owner = False
 
-            # Get cleaned questions (for past papers)
-            cleaned_questions = get_clean_questions(full_text)
-            print(f"❓ Found {len(cleaned_questions)} cleaned questions")
+    try:
+        ingest_key = ingest_registry.make_key(upload.sha256, subject, isPaper)
+        job = job_store.create(upload.filename, subject, isPaper)
+
+        if not force:
+            previous = await run_in_threadpool(ingest_registry.get_result, ingest_key)
+            if previous is not None:
+                print(f"♻️ {upload.filename} was already ingested for '{subject}', returning the earlier result")
+                upload.cleanup()
+                return job_store.update(job["job_id"], status=COMPLETED, stage="done", result=previous)
+
+        future, owner = ingest_registry.claim(ingest_key)
+        if not owner:
+            print(f"♻️ {upload.filename} is already being ingested for '{subject}', the job follows that run")
+            upload.cleanup()
+            future.add_done_callback(lambda done: _finish_duplicate_job(job["job_id"], done, upload.filename))
+            return job_store.update(job["job_id"], status=RUNNING, stage="waiting", queue_position=0)
+
+        _, queue_position = ingestion_executor.submit(
+            run_pdf_job, job["job_id"], ingest_key, isPaper, upload, subject
+        )
+    except BaseException as error:
+        # Saturated executor, a failed lookup or a cancelled request: no worker
+        # took the upload, so drop its temp file and the job nobody will poll,
+        # and fail the claim so duplicates waiting on it are not stuck
+        if owner:
+            ingest_registry.fail(ingest_key, error)
+        if job is not None:
+            job_store.delete(job["job_id"])
+        upload.cleanup()
+        raise
+
+    return job_store.update(job["job_id"], queue_position=queue_position)
+
+
+def _finish_duplicate_job(job_id: str, future, filename: str):
+    # Runs on whichever thread finished (or failed to start) the original ingest
+    error = future.exception()
+    result = None if error is not None else ingest_registry.duplicate_of(future.result(), filename)
+    if isinstance(result, dict):
+        job_store.update(job_id, status=COMPLETED, stage="done", result=result)
+    else:
+        job_store.update(job_id, status=FAILED, stage="failed", error=str(error) if error is not None else result)
+
+
+def run_pdf_job(job_id: str, ingest_key: str, isPaper: bool, upload: SpooledUpload, subject: str):
+    """
+    Worker entry point for a queued ingestion job
+    """
+    job_store.update(job_id, status=RUNNING, stage="parsing", queue_position=0)
+
+    def report_progress(stage: str, **counts):
+        job_store.update(job_id, stage=stage, progress=counts)
 
-            # Initialize question generator
-            question_generator = QuestionGenerationService()
-            structured_questions = []
-            new_questions = []
+    try:
+        result = _ingest_pdf(ingest_key, isPaper, upload, subject, report_progress)
+    except Exception as error:
+        result = f"Processing failed: {str(error)}"
+    finally:
+        upload.cleanup()
 
-            if isPaper:
-                # For past papers: classify existing questions
-                if cleaned_questions:
-                    structured_questions = classify_and_structure_questions(cleaned_questions)
-                    print(f"Structured {len(structured_questions)} existing questions")
-
-                # Check if we have enough MCQs from extracted questions
-                extracted_mcqs = [q for q in structured_questions if q.get('type') == 'MCQ']
-
-                # Only generate new MCQs if we don't have enough from extraction
-                if len(extracted_mcqs) < 4:  # Minimum threshold
-                    new_questions = question_generator.generate_questions_from_content(
-                        content=full_text,
-                        question_types=["MCQ", "Short Answer", "Essay"],
-                        num_questions=6  # Reduced for stability
-                    )
-                    print(f"Generated {len(new_questions)} new AI questions")
-                else:
-                    print("✅ Sufficient MCQs from extracted questions, skipping AI generation")
-                    new_questions = []
-
-                # Combine questions
-                all_questions = structured_questions + new_questions
-                print(f"Total questions: {len(all_questions)}")
+    if isinstance(result, dict):
+        job_store.update(job_id, status=COMPLETED, stage="done", result=result)
+    else:
+        job_store.update(job_id, status=FAILED, stage="failed", error=result)
+
+
+def _no_progress(stage: str, **counts):
+    pass
+
+
+def _ingest_pdf(ingest_key: str, isPaper: bool, upload: SpooledUpload, subject: str, report_progress=_no_progress):
+    """
+    Run the pipeline for an ingest key claimed with ingest_registry.claim,
+    copies of the file that arrived meanwhile get its result on release
+    """
+    result = None
+    try:
+        result = _process_pdf_contents(isPaper, upload.path, upload.filename, subject, report_progress)
+        ingest_registry.record(ingest_key, upload.sha256, upload.size, upload.filename, subject, isPaper, result)
+    finally:
+        ingest_registry.release(ingest_key, result)
+
+    return result
 
-            else:
-                # For lecture notes: Generate questions from content only
-                print("Processing as lecture notes - generating questions from content")
-
-                # Try AI generation first
-                new_questions = question_generator.generate_questions_from_lecture_notes(
-                    content=full_text,
-                    question_types=["MCQ", "Short Answer", "Essay"],
-                    num_questions=8,  # Target more questions
-                    subject=subject
-                )
-
-                # If AI fails or produces incomplete questions, use fallback
-                valid_mcqs = [q for q in new_questions if q.get('type') == 'MCQ' and
-                              q.get('options') and len(q.get('options', [])) == 4]
-
-                if len(valid_mcqs) < 2:  # Not enough good MCQs
-                    print("⚠️ Insufficient valid MCQs generated, using enhanced fallback")
-                    # Use fallback but ensure MCQs are complete
-                    fallback_questions = question_generator._generate_fallback_questions(
-                        full_text, ["MCQ", "Short Answer", "Essay"], 6, subject
-                    )
-                    # Ensure fallback MCQs are complete
-                    for q in fallback_questions:
-                        if q.get('type') == 'MCQ' and (not q.get('options') or len(q.get('options', [])) != 4):
-                            q['options'] = [
-                                f"Primary feature of {q.get('topic', 'the concept')}",
-                                f"Common misconception about {q.get('topic', 'the concept')}",
-                                f"Related but different concept",
-                                f"Historical context of {q.get('topic', 'the concept')}"
-                            ]
-                    new_questions = fallback_questions
-
-                print(f"Generated {len(new_questions)} questions from lecture notes")
-                all_questions = new_questions
-
-            #Final validation before saving
-            valid_questions = []
-            for q in all_questions:
-                if q.get('type') == 'MCQ':
-                    options = q.get('options', [])
-                    if len(options) == 4 and all(opt and len(opt.strip()) > 1 for opt in options):
-                        valid_questions.append(q)
-                    else:
-                        print(f"🔄 Filtered incomplete MCQ before saving: {q.get('text', '')[:50]}...")
-                else:
-                    valid_questions.append(q)
-
-            print(f"📊 Final validated questions: {len(valid_questions)}/{len(all_questions)}")
-
-            # If no questions were generated, create enhanced fallback questions
-            if not valid_questions:
-                print("⚠️ No valid questions generated, creating enhanced fallback questions")
-                valid_questions = question_generator._generate_fallback_questions(
-                    full_text, ["Short Answer", "Essay"], 4, subject  # Focus on reliable types
-                )
-                print(f"🔄 Created {len(valid_questions)} fallback questions")
-
-            # Save questions to Firebase
-            if valid_questions:
-                result = save_structured_questions(
-                    questions=valid_questions,
-                    subject=subject,
-                    source_file=file.filename
-                )
-                print(f"💾 Firebase save result: {result}")
-
-                return {
-                    "message": result,
-                    "questions_processed": len(valid_questions),
-                    "existing_questions": len(structured_questions),
-                    "ai_generated_questions": len(new_questions),
-                    "valid_questions": len(valid_questions),
-                    "subject": subject,
-                    "note": "Questions generated using AI" if not structured_questions else "Mixed extracted and AI-generated questions"
-                }
-            else:
-                return {
-                    "message": "No valid questions could be generated from the document",
-                    "questions_processed": 0,
-                    "existing_questions": 0,
-                    "ai_generated_questions": 0,
-                    "valid_questions": 0,
-                    "subject": subject,
-                    "note": "Please try a different document or check the content"
-                }
+
+def _open_pages(pdf_path: str, report_progress=_no_progress, log_prefix: str = "📄 ") -> PdfPages:
+    extracted_chars = [0]
+
+    def on_page(page_index: int, text: str):
+        extracted_chars[0] += len(text)
+        print(f"{log_prefix}Page {page_index + 1}: {len(text)} characters")
+        report_progress("parsing", pages_parsed=page_index + 1)
+
+    pages = PdfPages(pdf_path, on_page=on_page)
+    report_progress("parsing", total_pages=pages.page_count)
+
+    # Extract text from all pages, kept page by page in the on-disk spool
+    try:
+        pages.extract_all()
+    except Exception:
+        pages.close()
+        raise
+    print(f"📊 Total text extracted: {extracted_chars[0]} characters in {pages.page_count} pages")
+    return pages
+
+
+def _process_pdf_contents(isPaper: bool, pdf_path: str, filename: str, subject: str, report_progress=_no_progress):
+    try:
+        if pdf_path is not None:
+            print(f"📁 Processing PDF: {filename} for subject: {subject}")
+
+            with _open_pages(pdf_path, report_progress) as pages:
+                return _process_pdf_pages(isPaper, pages, filename, subject, report_progress)
 
         return "Reading failed"
     except Exception as error:
@@ -154,55 +181,176 @@ async def process_pdf(isPaper: bool, file: UploadFile, subject: str):
         return f"Processing failed: {str(error)}"
 
 
+def _process_pdf_pages(isPaper: bool, pages: PdfPages, filename: str, subject: str, report_progress=_no_progress):
+    # pages is re-iterable, the cleaners and the question generator stream it page by page
+    # Get cleaned questions (for past papers)
+    report_progress("extracting")
+    cleaned_questions = get_clean_questions(pages)
+    print(f"❓ Found {len(cleaned_questions)} cleaned questions")
+
+    # Initialize question generator
+    question_generator = QuestionGenerationService()
+    structured_questions = []
+    new_questions = []
+
+    if isPaper:
+        # For past papers: classify existing questions
+        if cleaned_questions:
+            report_progress("classifying")
+            structured_questions = classify_and_structure_questions(cleaned_questions)
+            print(f"Structured {len(structured_questions)} existing questions")
+
+        # Check if we have enough MCQs from extracted questions
+        extracted_mcqs = [q for q in structured_questions if q.get('type') == 'MCQ']
+
+        # Only generate new MCQs if we don't have enough from extraction
+        if len(extracted_mcqs) < 4:  # Minimum threshold
+            report_progress("generating", total_chunks=1)
+            new_questions = question_generator.generate_questions_from_content(
+                content=pages,
+                question_types=["MCQ", "Short Answer", "Essay"],
+                num_questions=6  # Reduced for stability
+            )
+            print(f"Generated {len(new_questions)} new AI questions")
+            report_progress("generating", chunks_generated=1)
+        else:
+            print("✅ Sufficient MCQs from extracted questions, skipping AI generation")
+            new_questions = []
+
+        # Combine questions
+        all_questions = structured_questions + new_questions
+        print(f"Total questions: {len(all_questions)}")
+
+    else:
+        # For lecture notes: Generate questions from content only
+        print("Processing as lecture notes - generating questions from content")
+
+        # Try AI generation first
+        new_questions = question_generator.generate_questions_from_lecture_notes(
+            content=pages,
+            question_types=["MCQ", "Short Answer", "Essay"],
+            num_questions=8,  # Target more questions
+            subject=subject,
+            report_progress=report_progress
+        )
+
+        # If AI fails or produces incomplete questions, use fallback
+        valid_mcqs = [q for q in new_questions if q.get('type') == 'MCQ' and
+                      q.get('options') and len(q.get('options', [])) == 4]
+
+        if len(valid_mcqs) < 2:  # Not enough good MCQs
+            print("⚠️ Insufficient valid MCQs generated, using enhanced fallback")
+            # Use fallback but ensure MCQs are complete
+            fallback_questions = question_generator._generate_fallback_questions(
+                pages, ["MCQ", "Short Answer", "Essay"], 6, subject
+            )
+            # Ensure fallback MCQs are complete
+            for q in fallback_questions:
+                if q.get('type') == 'MCQ' and (not q.get('options') or len(q.get('options', [])) != 4):
+                    q['options'] = [
+                        f"Primary feature of {q.get('topic', 'the concept')}",
+                        f"Common misconception about {q.get('topic', 'the concept')}",
+                        f"Related but different concept",
+                        f"Historical context of {q.get('topic', 'the concept')}"
+                    ]
+            new_questions = fallback_questions
+
+        print(f"Generated {len(new_questions)} questions from lecture notes")
+        all_questions = new_questions
+
+    #Final validation before saving
+    valid_questions = []
+    for q in all_questions:
+        if q.get('type') == 'MCQ':
+            options = q.get('options', [])
+            if len(options) == 4 and all(opt and len(opt.strip()) > 1 for opt in options):
+                valid_questions.append(q)
+            else:
+                print(f"🔄 Filtered incomplete MCQ before saving: {q.get('text', '')[:50]}...")
+        else:
+            valid_questions.append(q)
+
+    print(f"📊 Final validated questions: {len(valid_questions)}/{len(all_questions)}")
+
+    # If no questions were generated, create enhanced fallback questions
+    if not valid_questions:
+        print("⚠️ No valid questions generated, creating enhanced fallback questions")
+        valid_questions = question_generator._generate_fallback_questions(
+            pages, ["Short Answer", "Essay"], 4, subject  # Focus on reliable types
+        )
+        print(f"🔄 Created {len(valid_questions)} fallback questions")
+
+    # Save questions to Firebase
+    if valid_questions:
+        report_progress("saving")
+        result = save_structured_questions(
+            questions=valid_questions,
+            subject=subject,
+            source_file=filename
+        )
+        print(f"💾 Firebase save result: {result}")
+        if not str(result).startswith("Saving failed"):
+            report_progress("saving", questions_saved=len(valid_questions))
+
+        return {
+            "message": result,
+            "questions_processed": len(valid_questions),
+            "existing_questions": len(structured_questions),
+            "ai_generated_questions": len(new_questions),
+            "valid_questions": len(valid_questions),
+            "subject": subject,
+            "note": "Questions generated using AI" if not structured_questions else "Mixed extracted and AI-generated questions"
+        }
+    else:
+        return {
+            "message": "No valid questions could be generated from the document",
+            "questions_processed": 0,
+            "existing_questions": 0,
+            "ai_generated_questions": 0,
+            "valid_questions": 0,
+            "subject": subject,
+            "note": "Please try a different document or check the content"
+        }
+
+
 async def read_pdf_file(file:UploadFile):
     if file is not None:
 
-        contents = await file.read()
-        pdf_stream = BytesIO(contents)
-        doc = fitz.open(stream=pdf_stream, filetype="pdf")
+        with await spool_upload(file) as upload:
+            cleaned_questions = await document_executor.run(_extract_clean_questions, upload.path)
 
-        # Extract text from all pages
-        all_pages_text = []
-        for page_index, page in enumerate(doc):
-            text = page.get_text()
-            all_pages_text.append(text)
-            print(f" Page {page_index + 1}: {len(text)} characters")
-
-        full_text = "\n--- Page Break ---\n".join(all_pages_text)
-        print(f"Total text extracted: {len(full_text)} characters")
+    return cleaned_questions
 
+def _extract_clean_questions(pdf_path: str):
+    with _open_pages(pdf_path, log_prefix=" ") as pages:
         # Get cleaned questions (for past papers)
-        cleaned_questions = get_clean_questions(full_text)
-        print(f" Found {len(cleaned_questions)} cleaned questions")
+        cleaned_questions = get_clean_questions(pages)
+    print(f" Found {len(cleaned_questions)} cleaned questions")
 
     return cleaned_questions
 
 async def read_mock_test_papers(file:UploadFile):
     if file is not None:
 
-        contents = await file.read()
-        pdf_stream = BytesIO(contents)
-        doc = fitz.open(stream=pdf_stream,filetype="pdf")
+        with await spool_upload(file) as upload:
+            return await document_executor.run(_extract_mock_test_paper, upload.path)
 
-        all_pages = []
-        for page_index, page in enumerate(doc):
-            text = page.get_text()
-            all_pages.append(text)
-            print(f" Page {page_index + 1}: {len(text)} characters")
-
-        full_text = "\n--- Page Break ---\n".join(all_pages)
-        print(f"Total text extracted: {len(full_text)} characters")
-        print(full_text)
+def _extract_mock_test_paper(pdf_path: str):
+    with _open_pages(pdf_path, log_prefix=" ") as pages:
+        for page in pages:
+            print(page)
         print("\n\nCleaned-Q&A Block\n")
-        q_and_a_block = clean_mock_test_paper(full_text)
+        q_and_a_block = clean_mock_test_paper(pages)
 
-        print(q_and_a_block)
-        return q_and_a_block
+    print(q_and_a_block)
+    return q_and_a_block
 
 
 def clean_mock_test_paper(contents):
-
-    cleaned_pages = contents.split("\n--- Page Break ---\n")
+    """
+    contents is the joined PDF text or an iterable of page texts (PdfPages)
+    """
+    cleaned_pages = iter_pages(contents)
     questions_and_answers = []
     paper_subject = None
 
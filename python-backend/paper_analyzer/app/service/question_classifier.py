@@ -2,7 +2,7 @@ import re
 import random
 from typing import List, Dict
 from app.model.test_models import QuestionType
-from app.service.ai_model import model
+from app.service.ai_model import scheduler
 
 def classify_and_structure_questions(cleaned_questions: List[str]) -> List[Dict]:
     """
@@ -115,8 +115,8 @@ def generate_dynamic_mcq_options(question_text: str) -> tuple[str, List[str]]:
         Wrong3: [third wrong answer]
         """
 
-        #Use existing AI model
-        response = model(prompt) #Actual AI call
+        #Use existing AI model (batched with prompts from other requests)
+        response = scheduler.generate(prompt) #Actual AI call
 
         #Parse the AI response(need to adapt this based on AI's output format)
         correct, wrong_answers = parse_ai_mcq_response(response)
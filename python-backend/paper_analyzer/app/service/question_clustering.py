@@ -0,0 +1,248 @@
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from rapidfuzz import process, fuzz
+from typing import Dict, List, Tuple
+
+# Rows/columns per score block, a block is at most BLOCK_SIZE² float32 scores
+BLOCK_SIZE = 1024
+
+# Row shards per worker process, more shards keep every worker busy until the end
+SHARDS_PER_PROCESS = 4
+
+
+def sort_tokens(text: str) -> str:
+    """
+    Same normalisation fuzz.token_sort_ratio applies, done once per question
+    """
+    return " ".join(sorted(text.split()))
+
+
+def find_duplicate_roots(sorted_texts: List[str], row_start: int, row_end: int, similarity_threshold=90,
+                         block_size: int = BLOCK_SIZE, workers: int = -1) -> List[int]:
+    """
+    Group root of every question of sorted_texts, grouping the pairs (i, j),
+    i < j, with row_start <= i < row_end whose token sort ratio is
+    >= similarity_threshold.
+
+    Scores are computed block by block with rapidfuzz.process.cdist and the
+    pairs of a block are merged right away, so neither more than one
+    (row block x block_size) matrix nor a list of all pairs is ever alive.
+    """
+    total = len(sorted_texts)
+    parent = list(range(total))
+
+    for block_start in range(row_start, row_end, block_size):
+        block_end = min(block_start + block_size, row_end)
+        rows = sorted_texts[block_start:block_end]
+
+        # Only the upper triangle is needed, columns start at the row block
+        for col_start in range(block_start, total, block_size):
+            cols = sorted_texts[col_start:col_start + block_size]
+            scores = process.cdist(
+                rows, cols,
+                scorer=fuzz.ratio,
+                score_cutoff=similarity_threshold,
+                dtype=np.float32,
+                workers=workers
+            )
+
+            row_ids, col_ids = np.nonzero(scores >= similarity_threshold)
+            row_ids = row_ids + block_start
+            col_ids = col_ids + col_start
+            upper = row_ids < col_ids
+            for i, j in zip(row_ids[upper].tolist(), col_ids[upper].tolist()):
+                _union(parent, i, j)
+
+    return [_find(parent, i) for i in range(total)]
+
+
+def group_duplicates(total: int, pairs) -> List[int]:
+    """
+    Union-find over the duplicate pairs. Returns the group root of every
+    question, the root being the first (lowest index) question of its group.
+    """
+    parent = list(range(total))
+    for i, j in pairs:
+        _union(parent, i, j)
+    return [_find(parent, i) for i in range(total)]
+
+
+def _find(parent: List[int], i: int) -> int:
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def _union(parent: List[int], i: int, j: int):
+    # The lower index becomes the root, so a group's root is its first question
+    root_i, root_j = _find(parent, i), _find(parent, j)
+    if root_i < root_j:
+        parent[root_j] = root_i
+    elif root_j < root_i:
+        parent[root_i] = root_j
+
+
+def build_frequency_analysis(questions_and_sources, roots: List[int]) -> list:
+    """
+    Turn group roots into the count / percentage / source_files list
+    """
+    groups = {}
+    for i, (text, source_file) in enumerate(questions_and_sources):
+        root = roots[i]
+        if root not in groups:
+            groups[root] = {"question": questions_and_sources[root][0], "count": 0, "source_files": set()}
+        groups[root]["count"] += 1
+        groups[root]["source_files"].add(source_file)
+
+    total_questions = len(questions_and_sources)
+    analysis = []
+    for info in groups.values():
+        count = info["count"]
+        percent = round((count / total_questions) * 100, 2)
+        likelihood = percent  # simple heuristic
+        analysis.append({
+            "question": info["question"],
+            "count": count,
+            "percentage": percent,
+            "source_files": list(info["source_files"]),
+            "likelihood": likelihood
+        })
+
+    # Sort by frequency descending
+    analysis.sort(key=lambda x: x["count"], reverse=True)
+    return analysis
+
+
+def summarise_subjects(subject_results: dict) -> dict:
+    """
+    Build the all-subjects summary (breakdown, top repeated questions) from
+    the frequency analysis of each subject
+    """
+    subject_totals = {
+        subject: sum(item["count"] for item in analysis) for subject, analysis in subject_results.items()
+    }
+    total_questions = sum(subject_totals.values())
+
+    subject_analysis = {}
+    for subject, analysis in subject_results.items():
+        subject_total = subject_totals[subject]
+        subject_percentage = round((subject_total / total_questions) * 100, 2)
+
+        # Groups that have duplicates (count > 1), most repeated first
+        duplicate_groups = [group for group in analysis if group.get('count', 1) > 1]
+        top_questions = sorted(duplicate_groups, key=lambda x: x.get('count', 0), reverse=True)[:5]
+
+        subject_analysis[subject] = {
+            "total_questions": subject_total,
+            "percentage": subject_percentage,
+            "analysis": analysis,
+            "top_repeated_questions": top_questions
+        }
+
+    return {
+        "total_subjects": len(subject_results),
+        "total_questions": total_questions,
+        "subject_breakdown": {
+            subject: {
+                "count": data["total_questions"],
+                "percentage": data["percentage"]
+            } for subject, data in subject_analysis.items()
+        },
+        "detailed_analysis": subject_analysis
+    }
+
+
+def cluster_questions(questions_and_sources, similarity_threshold=90, block_size: int = BLOCK_SIZE,
+                      workers: int = -1) -> list:
+    """
+    Group near-duplicate questions of one subject and return the frequency analysis
+    """
+    if not questions_and_sources:
+        return []
+
+    sorted_texts = [sort_tokens(text) for text, _ in questions_and_sources]
+    roots = find_duplicate_roots(sorted_texts, 0, len(sorted_texts), similarity_threshold, block_size, workers)
+    return build_frequency_analysis(questions_and_sources, roots)
+
+
+def _row_shards(total: int, shard_work: int):
+    """
+    Split rows 0..total into (start, end) ranges of roughly shard_work
+    comparisons each. Row i compares against total - i columns (upper
+    triangle), so early shards hold fewer rows than late ones.
+    """
+    start = work = 0
+    for row in range(total):
+        work += total - row
+        if work >= shard_work:
+            yield start, row + 1
+            start, work = row + 1, 0
+    if start < total:
+        yield start, total
+
+
+# Sorted texts of every subject, set once per worker process by _init_worker
+_worker_texts = {}
+
+
+def _init_worker(sorted_texts: Dict[str, List[str]]):
+    global _worker_texts
+    _worker_texts = sorted_texts
+
+
+def _roots_for_rows(subject: str, row_start: int, row_end: int, similarity_threshold) -> List[Tuple[int, int]]:
+    # Runs in a worker process. Returns (question, root) for every question the
+    # rows row_start..row_end group with another one, at most one per question.
+    roots = find_duplicate_roots(_worker_texts[subject], row_start, row_end, similarity_threshold, workers=1)
+    return [(i, root) for i, root in enumerate(roots) if root != i]
+
+
+def cluster_subjects(subject_questions: Dict[str, list], similarity_threshold=90, processes: int = 1,
+                     min_parallel_pairs: int = 0) -> Dict[str, list]:
+    """
+    Frequency analysis of several subjects at once.
+
+    With processes > 1 every subject is cut into row shards of similar
+    comparison counts and the shards of all subjects run on one process pool,
+    so a single large subject is spread over every core. The duplicate pairs
+    are grouped in the workers, and the groups of every shard are merged per
+    subject with the same union-find as cluster_questions, so the result is
+    identical to the sequential run.
+    """
+    sorted_texts = {
+        subject: [sort_tokens(text) for text, _ in questions]
+        for subject, questions in subject_questions.items()
+    }
+    total_work = sum(len(texts) * (len(texts) + 1) // 2 for texts in sorted_texts.values())
+
+    if processes <= 1 or total_work < max(min_parallel_pairs, 1):
+        return {
+            subject: cluster_questions(questions, similarity_threshold)
+            for subject, questions in subject_questions.items()
+        }
+
+    shard_work = max(1, total_work // (processes * SHARDS_PER_PROCESS))
+    # (question, root) links of every shard, at most one per question and shard
+    links = {subject: [] for subject in subject_questions}
+
+    # Spawned (not forked) workers: the server process holds threads and the LLM.
+    # The texts go to every worker once, shards only send their row range.
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(sorted_texts,)) as pool:
+        futures = {}
+        for subject, texts in sorted_texts.items():
+            for row_start, row_end in _row_shards(len(texts), shard_work):
+                future = pool.submit(_roots_for_rows, subject, row_start, row_end, similarity_threshold)
+                futures[future] = subject
+
+        for future in as_completed(futures):
+            links[futures[future]].extend(future.result())
+
+    return {
+        subject: build_frequency_analysis(questions, group_duplicates(len(questions), links[subject]))
+        for subject, questions in subject_questions.items()
+    }
@@ -2,30 +2,17 @@ import os
 from logging.config import valid_ident
 from typing import List
 
-import app.config.server_config as config
-from ctransformers import AutoModelForCausalLM
+from app.service.model_registry import ModelRegistry
 from app.model.test_models import QuestionType
+from app.service.pdf_pages import iter_lines, iter_split, text_head
 import re
 
 class QuestionGenerationService:
     def __init__(self):
-        base_dir = os.path.dirname(__file__)
-        model_path = os.path.abspath(os.path.join(base_dir, "..", "..", "resources", "mistral-7b-instruct-v0.1.Q4_K_S.gguf"))
-
-        if config.USE_CPU_FOR_AI:
-            self.model = AutoModelForCausalLM.from_pretrained(
-                model_path,
-                model_type="mistral",
-                local_files_only=True,
-                context_length=2048
-            )
-        else:
-            self.model = AutoModelForCausalLM.from_pretrained(
-                model_path,
-                model_type="mistral",
-                gpu_layers=15,
-                context_length=2048
-            )
+        # Reuse the process-wide model instead of loading the GGUF again
+        self.model = ModelRegistry().get_model()
+        # All prompts go through the shared micro-batching queue
+        self.scheduler = ModelRegistry().get_scheduler()
 
     def generate_questions_from_content(self, content: str, question_types: list, num_questions: int = 10, subject: str = "General"):
         """
@@ -40,7 +27,7 @@ class QuestionGenerationService:
             prompt = self._build_question_generation_prompt(content_sample, question_types, num_questions, subject)
             print(f"🤖 Generating questions with prompt length: {len(prompt)}")
 
-            response = self.model(prompt, max_new_tokens=800)  # Reduced tokens
+            response = self.scheduler.generate(prompt, max_new_tokens=800)  # Reduced tokens
             print(f"🤖 AI response received: {len(response)} characters")
             print(f"🤖 AI response preview: {response[:200]}...")
 
@@ -67,13 +54,15 @@ class QuestionGenerationService:
             # Fallback: generate simple questions if AI fails
             return self._generate_fallback_questions(content, question_types, num_questions, subject)
 
-    def _extract_key_content(self, content: str, max_chars: int = 1000) -> str:
+    def _extract_key_content(self, content, max_chars: int = 1000) -> str:
         """
         Extract the most important content from lecturer notes
+        (content is the text or an iterable of page texts)
         """
         # Remove page headers, footers, and unwanted content
-        lines = content.split('\n')
+        lines = iter_lines(content)
         filtered_lines = []
+        filtered_length = -1
 
         #Filter out non-educational content
         for line in lines:
@@ -89,6 +78,10 @@ class QuestionGenerationService:
             ):
 
                 filtered_lines.append(line)
+                filtered_length += len(line) + 1
+                #Past max_chars the rest would be cut off anyway
+                if filtered_length > max(max_chars, 200):
+                    break
 
         #Join and limit content
         key_content = ' '.join(filtered_lines)
@@ -96,7 +89,7 @@ class QuestionGenerationService:
         #If content is still too short, include more context
         if len(key_content) < 200:
             #Take first 500 chars as fallback
-            key_content = content[:500]
+            key_content = text_head(content, 500)
 
         # Limit to max_chars while preserving sentences
         if len(key_content) > max_chars:
@@ -221,7 +214,7 @@ class QuestionGenerationService:
         return questions[:num_questions]
 
     def generate_questions_from_lecture_notes(self, content: str, question_types: list, num_questions: int = 6,
-                                              subject: str = "General"):
+                                              subject: str = "General", report_progress=None):
         """
         Generate questions from lecture notes using chunking and multiple AI calls
         """
@@ -231,22 +224,38 @@ class QuestionGenerationService:
             #Extract content chunks instead of single summary
             chunks = self._extract_content_chunks(content, max_chunks=5)
             print(f"Extracted {len(chunks)} content chunks")
+            if report_progress:
+                report_progress("generating", total_chunks=len(chunks))
 
             all_questions = []
             questions_per_chunk = max(1, num_questions // len(chunks))
 
-            #Process each chunk with separate AI call
-            for i, chunk in enumerate(chunks):
-                print(f"Processing chunk {i+1}/{len(chunks)}: {len(chunk)} chars")
-
-                chunk_questions = self._generate_questions_from_chunk(
-                    chunk, question_types, questions_per_chunk, subject, f"Chunk_{i+1}"
-                )
-                all_questions.extend(chunk_questions)
-
-                #Stop if we have enough questions
-                if len(all_questions) >= num_questions:
-                    break
+            #Queue every chunk prompt up front so they are batched together
+            pending_responses = []
+            try:
+                for chunk in chunks:
+                    pending_responses.append(self._submit_chunk_prompt(chunk, questions_per_chunk, subject))
+
+                #Process each chunk with separate AI call
+                for i, chunk in enumerate(chunks):
+                    print(f"Processing chunk {i+1}/{len(chunks)}: {len(chunk)} chars")
+
+                    chunk_questions = self._generate_questions_from_chunk(
+                        chunk, question_types, questions_per_chunk, subject, f"Chunk_{i+1}",
+                        pending_response=pending_responses[i]
+                    )
+                    all_questions.extend(chunk_questions)
+                    if report_progress:
+                        report_progress("generating", chunks_generated=i + 1)
+
+                    #Stop if we have enough questions
+                    if len(all_questions) >= num_questions:
+                        break
+            finally:
+                #Drop chunks that have not started generating yet (enough questions or a failure),
+                #so the scheduler does not spend the model on prompts nobody reads
+                for pending_response in pending_responses:
+                    pending_response.cancel()
 
             #Ensure we have at least 2 of each type
             final_questions = self._balance_question_types(all_questions, question_types, num_questions)
@@ -258,16 +267,21 @@ class QuestionGenerationService:
             print(f"❌ Chunked processing failed: {e}")
             return self._generate_fallback_questions(content, question_types, num_questions, subject)
 
-    def _extract_content_chunks(self, content: str, max_chunks: int = 5) -> List[str]:
+    def _extract_content_chunks(self, content, max_chunks: int = 5) -> List[str]:
         """
         Extract meaningful chunks from lecture notes content
+        (content is the text or an iterable of page texts)
         """
         chunks = []
 
         # Split by major sections (headings, page breaks, etc.)
-        sections = re.split(r'\n--- Page Break ---\n|\n# |\n## |\n• |\n- ', content)
+        sections = iter_split(content, r'\n--- Page Break ---\n|\n# |\n## |\n• |\n- ')
 
         for section in sections:
+            #Only the first max_chunks chunks are ever used
+            if len(chunks) >= max_chunks:
+                break
+
             section = section.strip()
             if len(section) < 50:  # Too short
                 continue
@@ -300,21 +314,24 @@ class QuestionGenerationService:
 
         # If no good chunks found, create from sentences
         if not selected_chunks:
-            sentences = re.split(r'[.!?]+', content)
-            meaningful_sentences = [s.strip() for s in sentences if len(s.strip()) > 30]
+            meaningful_sentences = []
+            for s in iter_split(content, r'[.!?]+'):
+                if len(s.strip()) > 30:
+                    meaningful_sentences.append(s.strip())
+                    if len(meaningful_sentences) == 8:
+                        break
             if meaningful_sentences:
                 chunk = ' '.join(meaningful_sentences[:8])
                 selected_chunks.append(chunk[:1000])
 
-        return selected_chunks if selected_chunks else [content[:1000]]
+        return selected_chunks if selected_chunks else [text_head(content, 1000)]
 
-    def _generate_questions_from_chunk(self, chunk: str, question_types: list, num_questions: int, subject: str, chunk_id: str):
+    def _build_chunk_prompt(self, chunk: str, num_questions: int, subject: str) -> str:
         """
-        Generate questions from a single content chunk
+        Build the prompt used to generate questions from one content chunk
         """
-        try:
-            # Simple, focused prompt for each chunk
-            prompt = f"""Based on this educational content about {subject}, create {num_questions} test questions:
+        # Simple, focused prompt for each chunk
+        return f"""Based on this educational content about {subject}, create {num_questions} test questions:
     
             CONTENT: {chunk}
             
@@ -336,8 +353,23 @@ class QuestionGenerationService:
             
             Create questions now:"""
 
+    def _submit_chunk_prompt(self, chunk: str, num_questions: int, subject: str):
+        """
+        Queue the chunk prompt on the inference scheduler and return its future
+        """
+        prompt = self._build_chunk_prompt(chunk, num_questions, subject)
+        return self.scheduler.submit(prompt, max_new_tokens=400, temperature=0.7)
+
+    def _generate_questions_from_chunk(self, chunk: str, question_types: list, num_questions: int, subject: str, chunk_id: str,
+                                       pending_response=None):
+        """
+        Generate questions from a single content chunk
+        """
+        try:
             print(f"Generating from chunk {chunk_id} ({len(chunk)} chars)")
-            response = self.model(prompt, max_new_tokens=400, temperature=0.7)
+            if pending_response is None:
+                pending_response = self._submit_chunk_prompt(chunk, num_questions, subject)
+            response = pending_response.result()
 
             if response and len(response.strip()) > 50:
                 questions = self._parse_generated_questions(response, question_types, subject)
@@ -374,8 +406,8 @@ class QuestionGenerationService:
 
         return questions[:target_count]
 
-    def _extract_topics(self, content: str) -> list:
-        """Extract key topics from content for fallback questions"""
+    def _extract_topics(self, content) -> list:
+        """Extract key topics from content (text or page texts) for fallback questions"""
         topics = []
         # General educational keywords that work for any subject
         keywords = [
@@ -384,11 +416,12 @@ class QuestionGenerationService:
             "analysis", "evaluation", "comparison", "characteristics", "features"
         ]
 
-        content_lower = content.lower()
-
         # Extract sentences that might contain topics
-        sentences = content.split('.')
+        sentences = iter_split(content, r'\.')
         for sentence in sentences:
+            # Only the first 3 topics are used
+            if len(topics) >= 3:
+                break
             if len(sentence.strip()) > 20:  # Reasonable sentence length
                 # Take first few words as topic
                 words = sentence.strip().split()[:4]
@@ -521,6 +554,8 @@ class QuestionGenerationService:
         """
         enhanced_questions = []
 
+        # Queue all variation prompts first so they run as one batch
+        pending = []
         for question in existing_questions[:5]:  # Limit to avoid too many tokens
             prompt = f"""
             Based on this educational content and the following question, create 2 different questions
@@ -542,9 +577,11 @@ class QuestionGenerationService:
             NEW_QUESTION: [Question text]
             TYPE: [MCQ/SHORT_ANSWER/ESSAY]
             """
+            pending.append((question, self.scheduler.submit(prompt, max_new_tokens=500)))
 
+        for question, pending_response in pending:
             try:
-                response = self.model(prompt, max_new_tokens=500)
+                response = pending_response.result()
                 new_questions = self._parse_enhancement_response(response, question['type'])
                 enhanced_questions.extend(new_questions)
 
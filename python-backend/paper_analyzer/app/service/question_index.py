@@ -0,0 +1,88 @@
+import difflib
+import math
+from collections import Counter, defaultdict
+from typing import List, Tuple
+
+
+class QuestionMatchIndex:
+    """
+    Character n-gram inverted index over the stored questions of one subject.
+
+    It shortlists the stored questions that *can* reach a difflib
+    SequenceMatcher ratio >= threshold against a new question, so the exact
+    (slow) ratio only runs on that shortlist.
+
+    The shortlist is exact, not approximate:
+      * ratio = 2M / (la + lb), so 2 * min(la, lb) / (la + lb) >= threshold
+      * the matched characters M form a common subsequence, so the indel
+        distance is at most (1 - threshold) * (la + lb) = k
+      * strings within k edits share at least max(la, lb) - n + 1 - k * n
+        n-grams (q-gram lemma)
+    A stored question failing either bound can never reach the threshold.
+    """
+
+    def __init__(self, existing_questions: List[Tuple[str, str]], n: int = 3):
+        self.n = n
+        self.questions = existing_questions
+        self._cleaned = []
+        self._postings = defaultdict(list)      # gram -> [(question_id, count)]
+        self._by_length = defaultdict(list)     # length -> [question_id]
+
+        for question_id, (text, _source_file) in enumerate(existing_questions):
+            cleaned = text.strip().lower()
+            self._cleaned.append(cleaned)
+            self._by_length[len(cleaned)].append(question_id)
+            for gram, count in self._gram_counts(cleaned).items():
+                self._postings[gram].append((question_id, count))
+
+        self._lengths = sorted(self._by_length)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def _gram_counts(self, text: str) -> Counter:
+        n = self.n
+        return Counter(text[i:i + n] for i in range(len(text) - n + 1))
+
+    def candidates(self, query_clean: str, threshold: float) -> List[int]:
+        """
+        Ids (in stored order) of questions that may reach the threshold
+        """
+        query_length = len(query_clean)
+
+        shared = defaultdict(int)
+        for gram, query_count in self._gram_counts(query_clean).items():
+            for question_id, count in self._postings.get(gram, ()):
+                shared[question_id] += min(query_count, count)
+
+        shortlisted = []
+        for length in self._lengths:
+            total = query_length + length
+            if total and 2 * min(query_length, length) < threshold * total:
+                continue
+
+            # Max indel distance allowed at this length (epsilon keeps it conservative)
+            max_edits = math.floor((1 - threshold) * total + 1e-9)
+            required = max(query_length, length) - self.n + 1 - max_edits * self.n
+
+            if required <= 0:
+                shortlisted.extend(self._by_length[length])
+            else:
+                shortlisted.extend(
+                    question_id for question_id in self._by_length[length]
+                    if shared.get(question_id, 0) >= required
+                )
+
+        shortlisted.sort()
+        return shortlisted
+
+    def find_matches(self, new_question: str, threshold: float):
+        """
+        Yield (question_id, similarity) for every stored question with
+        SequenceMatcher ratio >= threshold, in stored order
+        """
+        query_clean = new_question.strip().lower()
+        for question_id in self.candidates(query_clean, threshold):
+            similarity = difflib.SequenceMatcher(None, query_clean, self._cleaned[question_id]).ratio()
+            if similarity >= threshold:
+                yield question_id, similarity
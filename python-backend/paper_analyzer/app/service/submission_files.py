@@ -0,0 +1,101 @@
+import base64
+import re
+from urllib.parse import quote
+from typing import Iterator, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from app.service.blob_store import get_blob_store, BlobNotFoundError
+from app.service.pdf_pages import SpooledUpload
+
+# Every submission field except a legacy inline PDF, for listing submissions
+SUBMISSION_LIST_FIELDS = [
+    "id", "assignmentId", "studentEmail", "studentName", "classId", "fileName", "fileSize", "hasPdf",
+    "pdfBlob", "submittedAt", "status", "isLate", "daysLate", "grade", "achievedGrade", "totalGrade",
+    "teacherFeedback", "gradedAt", "gradedBy"
+]
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def store_submission_pdf(upload: SpooledUpload) -> dict:
+    """
+    Put a spooled PDF in the blob store, returns the fields that reference it
+    """
+    blob_key = get_blob_store().put_file(upload.path, upload.sha256)
+    return {
+        "pdfBlob": blob_key,
+        "fileSize": upload.size,
+        "hasPdf": True
+    }
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) of a single "bytes=" range, None to send the whole file.
+    Raises 416 for a range that lies outside the file.
+    """
+    if not range_header:
+        return None
+
+    match = _RANGE_PATTERN.match(range_header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        # Multiple or malformed ranges, the whole file is a valid answer
+        return None
+
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def _iter_bytes(data: bytes, start: int, end: int, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+    for offset in range(start, end + 1, chunk_size):
+        yield data[offset:min(offset + chunk_size, end + 1)]
+
+
+def submission_pdf_response(submission_data: dict, range_header: Optional[str] = None) -> StreamingResponse:
+    """
+    Stream a submission's PDF, honouring a single Range request.
+    Submissions stored before the blob store still carry an inline pdfBase64.
+    """
+    blob_key = submission_data.get("pdfBlob")
+    pdf_base64 = submission_data.get("pdfBase64")
+
+    if blob_key:
+        store = get_blob_store()
+        try:
+            size = store.size(blob_key)
+        except BlobNotFoundError:
+            raise HTTPException(status_code=404, detail="PDF not found")
+        read_range = lambda start, end: store.iter_range(blob_key, start, end)
+    elif pdf_base64:
+        pdf_bytes = base64.b64decode(pdf_base64)
+        size = len(pdf_bytes)
+        read_range = lambda start, end: _iter_bytes(pdf_bytes, start, end)
+    else:
+        raise HTTPException(status_code=404, detail="PDF not found")
+
+    file_name = submission_data.get("fileName") or "submission.pdf"
+    ascii_name = file_name.encode("ascii", "replace").decode("ascii").replace('"', "")
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(file_name)}"
+    }
+
+    byte_range = parse_range(range_header, size)
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(read_range(start, end) if size else iter(()), status_code=status_code,
+                             media_type="application/pdf", headers=headers)
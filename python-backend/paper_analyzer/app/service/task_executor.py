@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import app.config.server_config as config
+
+
+class ExecutorSaturatedError(Exception):
+    """
+    Raised when a bounded executor has no free worker and its queue is full
+    """
+
+    def __init__(self, name: str, running: int, queued: int, capacity: int, retry_after: int):
+        self.name = name
+        self.running = running
+        self.queued = queued
+        self.capacity = capacity
+        self.retry_after = retry_after
+        super().__init__(f"{name} executor is busy ({running} running, {queued} queued)")
+
+    def to_dict(self) -> dict:
+        return {
+            "message": f"Server is busy processing other {self.name} jobs, please retry later",
+            "executor": self.name,
+            "running": self.running,
+            "queued": self.queued,
+            "capacity": self.capacity,
+            "retry_after_seconds": self.retry_after
+        }
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a fixed number of workers and a bounded waiting queue.
+
+    Blocking work (LLM inference, PyMuPDF parsing, reportlab rendering) runs
+    here so the FastAPI event loop keeps serving other routes. When all
+    workers are busy and max_queue jobs are already waiting, submit() raises
+    ExecutorSaturatedError instead of queueing more work.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def submit(self, fn, *args, **kwargs) -> tuple[Future, int]:
+        """
+        Admit a job and return (future, queue_position).
+        queue_position is 0 when a worker picks the job up straight away.
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._rejected += 1
+                raise ExecutorSaturatedError(
+                    self.name,
+                    running=min(self._in_flight, self.max_workers),
+                    queued=max(0, self._in_flight - self.max_workers),
+                    capacity=self.capacity,
+                    retry_after=config.EXECUTOR_RETRY_AFTER_SECONDS
+                )
+            self._in_flight += 1
+            queue_position = max(0, self._in_flight - self.max_workers)
+
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+
+        future.add_done_callback(lambda _: self._release(completed=True))
+        return future, queue_position
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run fn on the pool and await its result without blocking the event loop
+        """
+        future, queue_position = self.submit(fn, *args, **kwargs)
+        if queue_position:
+            print(f"⏳ {self.name} job queued at position {queue_position}")
+        return await asyncio.wrap_future(future)
+
+    def _release(self, completed: bool = False):
+        with self._lock:
+            self._in_flight -= 1
+            if completed:
+                self._completed += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "workers": self.max_workers,
+                "running": min(self._in_flight, self.max_workers),
+                "queued": max(0, self._in_flight - self.max_workers),
+                "capacity": self.capacity,
+                "completed": self._completed,
+                "rejected": self._rejected
+            }
+
+
+# Long LLM pipelines (PDF ingestion)
+ingestion_executor = BoundedExecutor("ingestion", config.INGESTION_WORKERS, config.INGESTION_QUEUE_SIZE)
+
+# Short CPU-bound document work (PDF text extraction, PDF rendering)
+document_executor = BoundedExecutor("document", config.DOCUMENT_WORKERS, config.DOCUMENT_QUEUE_SIZE)
@@ -0,0 +1,130 @@
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from app.config.firebase_connection import FirebaseConnector
+from app.model.firebase_db_model import increment_teacher_stats, get_teacher_stats, replace_teacher_stats
+
+# Counter names shared by the totals doc and the monthly docs
+CLASSES = "classesCreated"
+ASSIGNMENTS = "assignmentsCreated"
+GRADED = "submissionsGraded"
+
+
+def month_key(when: datetime = None) -> str:
+    return (when or datetime.now()).strftime("%Y-%m")
+
+
+def _parse_month(date_str: str):
+    if not date_str:
+        return None
+    try:
+        return month_key(datetime.fromisoformat(date_str.replace('Z', '+00:00')))
+    except ValueError:
+        return None
+
+
+def record_class_created(teacher_id: str, class_id: str, when: datetime = None, writes: list = ()):
+    """
+    Count a new class, committed in one batch with `writes` (the class itself)
+    """
+    increment_teacher_stats(teacher_id, month_key(when), {CLASSES: 1}, class_id=class_id, writes=writes)
+
+
+def record_assignment_created(teacher_id: str, when: datetime = None, writes: list = ()):
+    increment_teacher_stats(teacher_id, month_key(when), {ASSIGNMENTS: 1}, writes=writes)
+
+
+def record_submission_graded(teacher_id: str, when: datetime = None, writes: list = ()):
+    increment_teacher_stats(teacher_id, month_key(when), {GRADED: 1}, writes=writes)
+
+
+def get_monthly_stats(teacher_id: str, when: datetime = None) -> dict:
+    """
+    A teacher's totals and the counters of one month, read from two
+    documents. Teachers whose stats were never rebuilt from history are
+    rebuilt first.
+    """
+    month = month_key(when)
+    totals, monthly = get_teacher_stats(teacher_id, month)
+    # Counters written before the first rebuild miss the teacher's history
+    if not (totals or {}).get("rebuilt"):
+        rebuild_teacher_stats(teacher_id)
+        totals, monthly = get_teacher_stats(teacher_id, month)
+
+    totals = totals or {}
+    monthly = monthly or {}
+    return {
+        "month": month,
+        "class_ids": sorted(totals.get("classIds", [])),
+        "total_classes": totals.get(CLASSES, 0),
+        "total_assignments": totals.get(ASSIGNMENTS, 0),
+        "total_graded": totals.get(GRADED, 0),
+        "monthly_classes": monthly.get(CLASSES, 0),
+        "monthly_assignments": monthly.get(ASSIGNMENTS, 0),
+        "monthly_graded": monthly.get(GRADED, 0)
+    }
+
+
+def rebuild_teacher_stats(teacher_id: str = None) -> int:
+    """
+    Recount the stats of one teacher (or all of them) from the classes,
+    assignments and graded submissions, returns the number of teachers rebuilt
+    """
+    db = FirebaseConnector().get_connection()
+
+    if teacher_id is not None:
+        teacher_ids = [teacher_id]
+    else:
+        teacher_ids = set()
+        for collection, teacher_field in (("classes", "teacherId"), ("assignments", "teacherId"),
+                                          ("submissions", "gradedBy")):
+            for doc in db.collection(collection).select([teacher_field]).stream():
+                teacher_ids.add(doc.to_dict().get(teacher_field))
+        teacher_ids.discard(None)
+
+    for teacher in teacher_ids:
+        # Counted inside the rebuild transaction, see replace_teacher_stats
+        replace_teacher_stats(teacher, lambda transaction, teacher=teacher: _count_history(db, teacher, transaction))
+
+    print(f"📈 Rebuilt teacher stats for {len(teacher_ids)} teacher(s)")
+    return len(teacher_ids)
+
+
+def _count_history(db, teacher_id: str, transaction):
+    """
+    (totals, monthly) counters of one teacher from the classes, assignments
+    and graded submissions
+    """
+    def by_teacher(collection, teacher_field, *fields):
+        return (db.collection(collection).where(teacher_field, "==", teacher_id)
+                .select([teacher_field, *fields]).stream(transaction=transaction))
+
+    totals = {CLASSES: 0, ASSIGNMENTS: 0, GRADED: 0, "classIds": [], "rebuilt": True}
+    monthly = defaultdict(lambda: defaultdict(int))
+
+    def count(counter, date_str):
+        totals[counter] += 1
+        month = _parse_month(date_str)
+        if month:
+            monthly[month][counter] += 1
+
+    for doc in by_teacher("classes", "teacherId", "createdAt"):
+        count(CLASSES, doc.to_dict().get("createdAt"))
+        totals["classIds"].append(doc.id)
+
+    for doc in by_teacher("assignments", "teacherId", "created"):
+        count(ASSIGNMENTS, doc.to_dict().get("created"))
+
+    for doc in by_teacher("submissions", "gradedBy", "gradedAt", "status"):
+        data = doc.to_dict()
+        if data.get("status") == "graded":
+            count(GRADED, data.get("gradedAt"))
+
+    return totals, {month: dict(counters) for month, counters in monthly.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the materialized teacher stats from history")
+    parser.add_argument("--teacher", help="only rebuild this teacher id")
+    args = parser.parse_args()
+    rebuild_teacher_stats(args.teacher)
@@ -16,6 +16,7 @@ PACKAGE_MAP = {
     "firebase_admin": "firebase-admin",
     "multipart": "python-multipart",
     "rapidfuzz":"rapidfuzz",
+    "numpy": "numpy",
     "pydantic": "pydantic",
     "python_multipart": "python-multipart",
     "reportlab": "reportlab",
@@ -0,0 +1,53 @@
+"""
+Lines per second of normalizePdfQuestions over the golden fixture corpus.
+
+    python tests/benchmark_normalize.py --copies 200 --rounds 5
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.service.pdf_pages import PAGE_BREAK
+from app.service.pdf_question_preparer import normalizePdfQuestions
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "normalize")
+
+
+def load_pages() -> list:
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.txt"))):
+        if not path.endswith(".expected.txt"):
+            with open(path, encoding="utf-8", newline="") as fixture:
+                pages.extend(fixture.read().split(PAGE_BREAK))
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--copies", type=int, default=200, help="times the corpus is repeated into one document")
+    parser.add_argument("--rounds", type=int, default=5, help="timed runs, the best one is reported")
+    args = parser.parse_args()
+
+    text = PAGE_BREAK.join(load_pages() * args.copies)
+    line_count = text.count("\n") + 1
+
+    timings = []
+    for _ in range(args.rounds):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            normalizePdfQuestions(text)
+        timings.append(time.perf_counter() - started)
+
+    best = min(timings)
+    print(f"{line_count} lines, {len(text)} characters")
+    print(f"best of {args.rounds}: {best * 1000:.1f} ms, {line_count / best:,.0f} lines/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import app.config.server_config as config
+
+# The controllers connect on import, run them against the in-memory stand-in
+config.DB_BACKEND = "memory"
+
+from app.config.firebase_connection import FirebaseConnector
+from app.controller import teacher_controller
+
+
+def test_missing_report_skips_students_without_email():
+    db = FirebaseConnector().get_connection()
+    db.clear()
+    db.collection("assignments").document("a1").set({
+        "classId": "c1", "title": "Essay", "dueDate": "2020-01-01T00:00:00Z"
+    })
+    db.collection("submissions").document("sub1").set({
+        "assignmentId": "a1", "studentEmail": "cy@example.com", "studentName": "Cy",
+        "submittedAt": "2019-12-31T00:00:00Z", "isLate": False, "status": "submitted"
+    })
+    class_data = {"name": "Class", "students": [
+        {"id": "s1", "name": "Ann", "email": "ann@example.com"},
+        {"id": "s2", "name": "No Email"},
+        {"id": "s3", "name": "Empty Email", "email": ""},
+        {"id": "s4", "email": "bo@example.com"},
+        {"id": "s5", "name": "Cy", "email": "cy@example.com"}
+    ]}
+
+    report = teacher_controller._build_late_report("c1", class_data)
+
+    assert [(item["type"], item["studentEmail"], item["studentName"])
+            for item in report["late_missing_submissions"]] == [
+        ("missing_submission", "ann@example.com", "Ann"),
+        ("missing_submission", "bo@example.com", None)
+    ]
@@ -0,0 +1,30 @@
+import glob
+import os
+import pytest
+from app.service.pdf_pages import PAGE_BREAK
+from app.service.pdf_question_preparer import normalizePdfQuestions
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "normalize")
+
+# Every <name>.txt has a <name>.expected.txt, the output of the original
+# normalizePdfQuestions (two re.sub passes over the joined text)
+FIXTURES = sorted(
+    path for path in glob.glob(os.path.join(FIXTURE_DIR, "*.txt")) if not path.endswith(".expected.txt")
+)
+
+
+def _read(path: str) -> str:
+    with open(path, encoding="utf-8", newline="") as fixture:
+        return fixture.read()
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=os.path.basename)
+def test_matches_golden_output(path):
+    expected = _read(path[:-len(".txt")] + ".expected.txt")
+    assert normalizePdfQuestions(_read(path)) == expected
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=os.path.basename)
+def test_pages_match_joined_text(path):
+    text = _read(path)
+    assert normalizePdfQuestions(text.split(PAGE_BREAK)) == normalizePdfQuestions(text)